@@ -1,6 +1,12 @@
 
 from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import logging
+import numpy as np
+
+from SequenceOperations import quantize_scores, QUANTIZED_MISSING
+from result_io import VariableLengthMatrix
 
 
 class AutoCorrelationEngine() :
@@ -20,7 +26,7 @@ class AutoCorrelationEngine() :
 	Those functions are expected to take a specific amount of arguments. Consider using the functools.partial function to setup this object properly.
 	"""
 
-	def __init__( self, encoding_F, comparison_F, convolution_F, scoring_F, generator_F ) :
+	def __init__( self, encoding_F, comparison_F, convolution_F, scoring_F, generator_F, shift_matrix_F=None, threads=1, aligned_shift_matrix_F=None, precision="float64", spectrum_F=None, screen_F=None ) :
 		"""
 
 		encoding_F :
@@ -48,36 +54,620 @@ class AutoCorrelationEngine() :
 			-> Take one argument : array of vectors (representing a sequence)
 			-> return two array of vectors (representing shifted version of a sequence)
 
+		shift_matrix_F ( optional, required by process_vectorized ) :
+			-> Function for all-shifts generation at once ( example : SubSequenceGenerator.generate_shift_matrix )
+			-> Take one argument : array of vectors (representing a sequence)
+			-> return two arrays (shifted versions stacked as rows, cropped sequence broadcastable against rows)
+			-> comparison_F, convolution_F and scoring_F must then operate along the last axis
+
+		threads ( optional, default 1 ) :
+			-> number of threads sharing the shift rows in process_vectorized, process_chunked and process_stitched
+			-> the shift range is split into bands of rows, each band being written into its rows of a preallocated output
+			-> NumPy and SciPy kernels release the GIL, thus threads run concurrently
+
+		aligned_shift_matrix_F ( optional, required by process_aligned and extend ) :
+			-> Function for all-shifts generation with shift-independent columns ( example : SubSequenceGenerator.generate_aligned_shift_matrix )
+			-> Take three arguments : array of vectors (representing a sequence), min_shift and max_shift ( not fixed with partial )
+			-> return two arrays like shift_matrix_F, rows having the length of the sequence whatever the shift
+
+		precision ( optional, default float64 ) :
+			-> dtype policy of the protocol, one of PRECISIONS
+			-> float64 : stage outputs are kept as returned by the functions above
+			-> float32 : floating comparison and convolution outputs are brought down to float32, as well as scores
+			-> uint8   : like float32, then scores are quantized to uint8 codes ( see SequenceOperations.quantize_scores )
+			-> functions are best configured to produce float32 themselves ( example : moving_average with dtype=float32 ),
+			   the engine only casts outputs that are still float64
+
+		spectrum_F ( optional, required by process_spectrum ) :
+			-> Function computing identity for all shifts at once ( example : SequenceOperations.windowed_period_spectrum )
+			-> Take one argument : encoded sequence
+			-> return a 2D array (one row per shift), replacing shift generation, comparison and convolution
+
+		screen_F ( optional, required by process_screened ) :
+			-> Function selecting the cells worth computing ( example : SequenceOperations.kmer_spacing_screen )
+			-> Take four arguments : sequence (not encoded), min_shift, max_shift and window_size ( not fixed with partial )
+			-> return a 2D boolean array, one row per window of window_size positions, one column per shift
+
 		"""
 		self.EncodeSequence = encoding_F
 		self.CompareSequences = comparison_F
 		self.ConvolveSequence = convolution_F
 		self.ScoreSequence = scoring_F
 		self.GenerateSequenceShift = generator_F
+		self.GenerateShiftMatrix = shift_matrix_F
+		self.threads = threads
+		self.GenerateAlignedShiftMatrix = aligned_shift_matrix_F
+		if precision not in self.PRECISIONS :
+			raise ValueError(f"unknown precision {precision}, expected one of {', '.join(self.PRECISIONS)}")
+		self.precision = precision
+		self.ComputeSpectrum = spectrum_F
+		self.ScreenSequence = screen_F
+
+		self.aligned_sequence = None
+		self.aligned_shifts = range(0)
+		self.aligned_output = None
 
 		self.execution_times = list()
+		self.hooks = list()
 
-	def process_sequence_pair( self, sequence_1, sequence_2 ) :
-		identity  = self.CompareSequences( sequence_1, sequence_2 )
-		convolved = self.ConvolveSequence( identity )
-		scored    = self.ScoreSequence( convolved )
-		return scored
+	### INSTRUMENTATION ###
+
+	def add_hook( self, hook ) :
+		"""
+		register an instrumentation hook ( example : EngineProfiler.EngineProfiler ).
+		A hook is an object implementing the following methods :
+			-> record_started( sequence_length )    : a process method starts on a sequence
+			-> stage_done( stage, seconds, nbytes ) : a stage call returned, stage being one of STAGES,
+			                                          nbytes the size of the memory held by its output and not by its arguments
+			-> record_done( sequence_length, shifts ) : a process method is done, shifts being the number of shift rows computed
+		stage_done may be called concurrently from several threads ( see threads ).
+		"""
+		self.hooks.append( hook )
+
+	def remove_hook( self, hook ) :
+		self.hooks.remove( hook )
+
+	STAGES = ( "encoding", "screening", "shift_generation", "comparison", "convolution", "spectrum", "scoring" )
+
+	def run_stage( self, stage, function, *arguments ) :
+		"""
+		call function for a protocol stage, timing it when hooks are registered
+		"""
+		if not self.hooks :
+			return function( *arguments )
 
-	def process(self, sequence) :
-		logging.info(f"starting autocorrelation protocol")
 		start = perf_counter()
+		output = function( *arguments )
+		seconds = perf_counter() - start
 
-		sequence = self.EncodeSequence( sequence )
-		output = [ 
-			self.process_sequence_pair(sequence_1, sequence_2) 
-			for sequence_1, sequence_2 in self.GenerateSequenceShift(sequence)
-		]
+		# memory reached by the output, less the memory it shares with the arguments ( views, in place stages )
+		argument_owners = [ _memory_owner(array) for array in _held_arrays(arguments) ]
+		output_owners = { id(owner) : owner for owner in map( _memory_owner, _held_arrays(output) ) }.values()
+		nbytes = sum( owner.nbytes for owner in output_owners if not any( np.may_share_memory(owner, argument) for argument in argument_owners ) )
+		for hook in self.hooks :
+			hook.stage_done( stage, seconds, nbytes )
+		return output
+
+	@contextmanager
+	def recording( self, description, sequence_length ) :
+		"""
+		log and time a process method call, and notify hooks.
+		the body sets record["shifts"] to the number of shift rows it computed
+		"""
+		logging.info(f"starting {description}")
+		for hook in self.hooks :
+			hook.record_started( sequence_length )
+		start = perf_counter()
+		record = dict( shifts=0 )
+
+		yield record
 
 		end = perf_counter()
 		self.execution_times.append(end-start)
 		logging.info(f"execution done in {end-start:<10.8f} seconds")
+		for hook in self.hooks :
+			hook.record_done( sequence_length, record["shifts"] )
+
+	### PRECISION ###
+
+	PRECISIONS = ( "float64", "float32", "uint8" )
+
+	def apply_precision( self, array ) :
+		"""
+		bring floating arrays wider than float32 down to float32, unless precision is float64.
+		outputs that are not arrays ( example : SequenceOperations.compute_packed_identity ) are returned unchanged
+		"""
+		if self.precision == "float64" or not isinstance(array, np.ndarray) or array.dtype.kind != "f" or array.dtype.itemsize <= 4 :
+			return array
+		return array.astype( np.float32 )
+
+	def score_dtype( self ) :
+		"""
+		dtype of the scores produced under the precision policy, functions being configured as in EngineArguments.build_engine_arguments
+		"""
+		return np.dtype( { "float64" : np.float64, "float32" : np.float32, "uint8" : np.uint8 }[ self.precision ] )
+
+	def missing_value( self, dtype ) :
+		"""
+		returns the dtype able to hold missing values along scores of dtype, and the missing value itself
+		( QUANTIZED_MISSING with uint8 precision, NaN otherwise )
+		"""
+		if self.precision == "uint8" :
+			return np.dtype( np.uint8 ), QUANTIZED_MISSING
+		if np.dtype( dtype ).kind != "f" :
+			return np.dtype( np.float64 ), np.nan
+		return np.dtype( dtype ), np.nan
+
+	### PROTOCOL ###
+
+	@staticmethod
+	def shift_count( function ) :
+		"""
+		number of shifts generated by a shift generation function, read from the min_shift and max_shift keywords
+		it was set up with ( see functools.partial ). returns None when they are not known
+		"""
+		keywords = getattr( function, "keywords", None ) or dict()
+		if "min_shift" not in keywords or "max_shift" not in keywords :
+			return None
+		return max( keywords["max_shift"] - keywords["min_shift"], 0 )
+
+	def convolve_sequence_pair( self, sequence_1, sequence_2 ) :
+		identity  = self.apply_precision( self.run_stage( "comparison", self.CompareSequences, sequence_1, sequence_2 ) )
+		convolved = self.apply_precision( self.run_stage( "convolution", self.ConvolveSequence, identity ) )
+		return convolved
+
+	def score( self, convolved ) :
+		"""
+		score a convolved array, following the precision policy
+		"""
+		scored = self.apply_precision( self.run_stage( "scoring", self.ScoreSequence, convolved ) )
+		if self.precision == "uint8" :
+			scored = quantize_scores( scored )
+		return scored
+
+	def process_sequence_pair( self, sequence_1, sequence_2 ) :
+		convolved = self.convolve_sequence_pair( sequence_1, sequence_2 )
+		return self.score( convolved )
+
+	def process(self, sequence) :
+		"""
+		Run the protocol one shift at a time, over the pairs yielded by generator_F.
+		Rows are written in place into a single buffer allocated once the first (widest) row is known.
+		With generate_shifted_sequences_varLen rows get shorter as the shift grows : their tail is left
+		to NaN ( QUANTIZED_MISSING with uint8 precision ) and the valid length of each row is kept.
+		Pairs are generated one at a time, the number of rows being read from the shift range of generator_F ( see shift_count ).
+		When generator_F does not expose its shift range, all pairs are generated first to count them.
+
+		returns a VariableLengthMatrix (one row per shift, see result_io.VariableLengthMatrix)
+		"""
+		with self.recording( "autocorrelation protocol", len(sequence) ) as record :
+			sequence = self.run_stage( "encoding", self.EncodeSequence, sequence )
+			pairs = self.run_stage( "shift_generation", self.GenerateSequenceShift, sequence )
+			shifts = self.shift_count( self.GenerateSequenceShift )
+			if shifts is None :
+				pairs = list( pairs )
+				shifts = len( pairs )
+			row_lengths = np.zeros( shifts, dtype=np.intp )
+			output = np.empty( (0, 0) )
+			for row, (sequence_1, sequence_2) in enumerate(pairs) :
+				scores = self.process_sequence_pair(sequence_1, sequence_2)
+				if row == 0 :
+					dtype, missing = self.missing_value( scores.dtype )
+					output = np.full( (shifts, len(scores)), missing, dtype=dtype )
+				output[row, :len(scores)] = scores
+				row_lengths[row] = len(scores)
+			record["shifts"] = len(output)
+		return VariableLengthMatrix( output, row_lengths )
+
+	def process_vectorized(self, sequence, allocate=None) :
+		"""
+		Batched counterpart of process.
+		All shifts are compared, convolved and scored at once on a (n_shifts x length) matrix
+		built by shift_matrix_F, instead of one python iteration per shift.
+		returns a contiguous 2D array (one row per shift).
+
+		If allocate(shape, dtype) is given, the output is allocated with it (for instance a memory-mapped file)
+		and rows are written into it band by band ( see process_shift_bands ).
+		"""
+		if self.GenerateShiftMatrix is None :
+			raise ValueError("process_vectorized requires shift_matrix_F to be set at initialization")
+
+		with self.recording( "vectorized autocorrelation protocol", len(sequence) ) as record :
+			output = np.ascontiguousarray( self.process_shift_matrix(sequence, allocate) )
+			record["shifts"] = len(output)
+		return output
+
+	def process_shift_matrix(self, sequence, allocate=None) :
+		sequence = self.run_stage( "encoding", self.EncodeSequence, sequence )
+		return self.process_encoded_shift_matrix( sequence, allocate )
+
+	def process_encoded_shift_matrix(self, sequence, allocate=None, pair_F=None) :
+		"""
+		run the vectorized protocol on an already encoded sequence.
+		pair_F is the function applied on the shift matrix (default process_sequence_pair).
+		"""
+		if pair_F is None :
+			pair_F = self.process_sequence_pair
+		sequence_shifted, sequence_cropped = self.run_stage( "shift_generation", self.GenerateShiftMatrix, sequence )
+		return self.process_shift_views( sequence_shifted, sequence_cropped, allocate, pair_F )
+
+	def process_shift_views(self, sequence_shifted, sequence_cropped, allocate=None, pair_F=None) :
+		if pair_F is None :
+			pair_F = self.process_sequence_pair
+		if allocate is None and ( self.threads <= 1 or len(sequence_shifted) < 2 ) :
+			return pair_F(sequence_shifted, sequence_cropped)
+		return self.process_shift_bands(sequence_shifted, sequence_cropped, allocate, pair_F)
+
+	def convolve_shift_matrix(self, sequence, allocate=None) :
+		"""
+		run the vectorized protocol on an already encoded sequence, without scoring.
+		The returned matrix only depends on encoding, comparison, convolution and shift generation,
+		thus it can be stored and scored again with different scoring parameters ( see ResultCache ).
+		"""
+		with self.recording( "pre-scoring autocorrelation protocol", len(sequence) ) as record :
+			output = self.process_encoded_shift_matrix( sequence, allocate, pair_F=self.convolve_sequence_pair )
+			record["shifts"] = len(output)
+		return output
+
+	def process_shift_bands(self, sequence_shifted, sequence_cropped, allocate=None, pair_F=None) :
+		"""
+		split the rows of the shift matrix into bands processed on a pool of self.threads threads.
+		The first row is computed upfront to know the output width and dtype, then each band
+		writes its result into its own rows of the output preallocated with allocate(shape, dtype) (default np.empty).
+		Bands are smaller than rows/threads so that temporaries stay small and threads stay balanced.
+		"""
+		if allocate is None :
+			allocate = np.empty
+		if pair_F is None :
+			pair_F = self.process_sequence_pair
+		first_row = pair_F(sequence_shifted[:1], sequence_cropped)
+		output = allocate( (len(sequence_shifted),) + first_row.shape[1:], first_row.dtype )
+		output[:1] = first_row
+
+		band_count = max( min( 4 * self.threads, len(sequence_shifted) - 1 ), 0 )
+		band_limits = np.linspace( 1, len(sequence_shifted), band_count+1 ).astype(int)
+
+		def process_band( band_start, band_end ) :
+			output[band_start:band_end] = pair_F(sequence_shifted[band_start:band_end], sequence_cropped)
+
+		with ThreadPoolExecutor( max_workers=self.threads ) as pool :
+			list( pool.map(process_band, band_limits[:-1], band_limits[1:]) ) # consume results to propagate exceptions
+		return output
+
+	def process_batch(self, sequences, overlap, hop=1, max_padding=0.05, batch_bytes=2**22) :
+		"""
+		Batched counterpart of process_vectorized for many short sequences ( reads, amplicons ).
+
+		All sequences are concatenated and encoded by a single encoding_F call, so that they share one alphabet table.
+		They are then sorted by length and gathered into buckets of sequences whose lengths differ by at most
+		max_padding (relative), the (batch x shifts x length) arrays of a bucket holding about batch_bytes bytes. Sequences of a bucket are
+		right-padded to the same length and stacked into a (batch x length) array, so that shift generation,
+		comparison, convolution and scoring run once per bucket on a (batch x shifts x columns) array.
+		shift_matrix_F is applied on the transposed bucket, letters of all sequences being shifted at once.
+
+		Columns of a padded sequence are its own columns followed by columns depending on padding, which are dropped.
+		With generate_shift_matrix and a valid mode convolution, a sequence of length L has ceil((L-overlap+1)/hop) columns,
+		overlap being kernel_size + max_shift ( as for process_chunked ). Sequences shorter than overlap give matrices without columns.
+		Buckets are shared between self.threads threads.
+
+		inputs :
+			- sequences (list) : sequences as str or array[uint8]
+			- overlap (int) : kernel_size + max_shift
+			- hop (int) : number of positions between computed columns, as set on convolution_F
+			- max_padding (float) : maximal length difference within a bucket, relative to its shortest sequence
+			- batch_bytes (int) : size of the floating (batch x shifts x length) arrays of a bucket above which a new bucket is started
+
+		returns :
+			- outputs (list[array]) : one 2D matrix (one row per shift) per sequence, in input order, views of the bucket results
+		"""
+		if self.GenerateShiftMatrix is None :
+			raise ValueError("process_batch requires shift_matrix_F to be set at initialization")
+
+		letters = [ np.frombuffer(sequence.encode("ascii"), dtype=np.uint8) if isinstance(sequence, str) else np.asarray(sequence, dtype=np.uint8) for sequence in sequences ]
+		lengths = np.array( [ len(sequence) for sequence in letters ], dtype=np.intp )
+		offsets = np.concatenate( ([0], np.cumsum(lengths)) )
+		widths = -( -(lengths - overlap + 1) // hop )
+		outputs = [ None ] * len(letters)
+
+		with self.recording( f"batched autocorrelation protocol on {len(letters)} sequences", int(offsets[-1]) ) as record :
+			encoded = self.run_stage( "encoding", self.EncodeSequence, np.concatenate(letters) if letters else np.zeros(0, dtype=np.uint8) )
+			if not isinstance(encoded, np.ndarray) :
+				raise ValueError("process_batch requires encoding_F to return arrays")
+
+			def process_bucket( bucket ) :
+				padded = np.zeros( (len(bucket), lengths[bucket].max()) + encoded.shape[1:], dtype=encoded.dtype )
+				for row, index in zip( padded, bucket ) :
+					row[ :lengths[index] ] = encoded[ offsets[index]:offsets[index+1] ]
+				# letters along the first axis for shift_matrix_F, then sequences moved back first : (batch x shifts x letters)
+				sequence_shifted, sequence_cropped = self.run_stage( "shift_generation", self.GenerateShiftMatrix, np.moveaxis(padded, 0, 1) )
+				output = self.process_sequence_pair( np.moveaxis(sequence_shifted, 2, 0), np.moveaxis(sequence_cropped, 2, 0) )
+				for sequence_output, index in zip( output, bucket ) :
+					outputs[index] = sequence_output[ :, :widths[index] ]
+				return len(output[0])
+
+			# overlap bounds the number of shifts when it can not be read from shift_matrix_F
+			shifts = self.shift_count( self.GenerateShiftMatrix ) or overlap
+			bucket_letters = max( batch_bytes // ( max(shifts, 1) * max(self.score_dtype().itemsize, 4) ), 1 )
+			buckets = _length_buckets( lengths, np.flatnonzero(widths > 0), max_padding, bucket_letters )
+			with ThreadPoolExecutor( max_workers=max(self.threads, 1) ) as pool :
+				shift_counts = list( pool.map(process_bucket, buckets) )
+			record["shifts"] = max( shift_counts, default=0 )
+
+		# sequences shorter than overlap get no column, with one row per shift as with process_vectorized
+		computed = next( ( output for output in outputs if output is not None ), None )
+		empty = np.empty( ( self.shift_count(self.GenerateShiftMatrix) or record["shifts"], 0 ), dtype=self.score_dtype() if computed is None else computed.dtype )
+		return [ empty if output is None else output for output in outputs ]
+
+	def process_aligned(self, sequence, min_shift, max_shift) :
+		"""
+		Run the vectorized protocol with shift-independent column alignment, so that the shift range
+		can later be extended without recomputing the rows already computed ( see extend ).
+
+		Column j of every row corresponds to the window starting at position j of the sequence ( j*hop with a hop set on convolution_F ).
+		The row of shift s is computed on the len(sequence)-s positions available for this shift
+		(as generate_shifted_sequences_varLen does) and its tail, where no value exists, is filled with NaN.
+		With a valid mode convolution of kernel_size, the row of shift s holds ceil((len(sequence)-kernel_size+1-s)/hop) values
+		( see aligned_row_lengths ).
+
+		The encoded sequence and the output are kept by the engine for extend.
+		returns a VariableLengthMatrix (one row per shift from min_shift to max_shift excluded).
+		"""
+		if self.GenerateAlignedShiftMatrix is None :
+			raise ValueError("process_aligned requires aligned_shift_matrix_F to be set at initialization")
+
+		self.aligned_sequence = self.run_stage( "encoding", self.EncodeSequence, sequence )
+		self.aligned_shifts = range(0)
+		self.aligned_output = None
+		return self.extend( min_shift, max_shift )
+
+	def extend(self, min_shift=None, max_shift=None) :
+		"""
+		Change the shift range of the last process_aligned call, only computing rows of new shifts.
+		Rows of shifts already computed are copied from the previous output.
+
+		inputs :
+			- min_shift (int) : new minimal shift (default = unchanged)
+			- max_shift (int) : new maximal shift, excluded (default = unchanged)
+
+		returns :
+			- output (VariableLengthMatrix) : 2D array with one row per shift from min_shift to max_shift excluded
+		"""
+		if self.aligned_sequence is None :
+			raise ValueError("extend requires a previous call to process_aligned")
+
+		previous_shifts, previous_output = self.aligned_shifts, self.aligned_output
+		min_shift = previous_shifts.start if min_shift is None else min_shift
+		max_shift = previous_shifts.stop if max_shift is None else max_shift
+		shifts = range( min_shift, max_shift )
+		kept_shifts = range( max(min_shift, previous_shifts.start), min(max_shift, previous_shifts.stop) )
+		if len(kept_shifts) == 0 :
+			kept_shifts = range( min_shift, min_shift )
+
+		description = f"aligned autocorrelation protocol for shifts {min_shift} to {max_shift}, {len(kept_shifts)} rows reused"
+		with self.recording( description, len(self.aligned_sequence) ) as record :
+			new_rows = [
+				( new_shifts, self.process_aligned_rows(new_shifts) )
+				for new_shifts in ( range(min_shift, kept_shifts.start), range(kept_shifts.stop, max_shift) )
+				if len(new_shifts) > 0
+			]
+			width_source = previous_output if len(kept_shifts) > 0 else new_rows[0][1]
+			output = np.empty( (len(shifts), width_source.shape[1]), dtype=width_source.dtype )
+			if len(kept_shifts) > 0 :
+				output[ kept_shifts.start-min_shift : kept_shifts.stop-min_shift ] = previous_output[ kept_shifts.start-previous_shifts.start : kept_shifts.stop-previous_shifts.start ]
+			for new_shifts, rows in new_rows :
+				output[ new_shifts.start-min_shift : new_shifts.stop-min_shift ] = rows
+			record["shifts"] = len(shifts) - len(kept_shifts)
+
+		output = VariableLengthMatrix( output, self.aligned_row_lengths(output.shape[1], shifts) )
+		self.aligned_shifts, self.aligned_output = shifts, output
+		return output
+
+	def process_aligned_rows(self, shifts) :
+		"""
+		compute rows of the aligned output for a contiguous range of shifts, NaN filling row tails
+		( QUANTIZED_MISSING with uint8 precision )
+		"""
+		sequence_shifted, sequence_cropped = self.run_stage( "shift_generation", self.GenerateAlignedShiftMatrix, self.aligned_sequence, shifts.start, shifts.stop )
+		rows = np.asarray( self.process_shift_views(sequence_shifted, sequence_cropped) )
+		dtype, missing = self.missing_value( rows.dtype )
+		rows = rows.astype( dtype, copy=False )
+		for row, length in zip( rows, self.aligned_row_lengths(rows.shape[1], shifts) ) :
+			row[ length: ] = missing
+		return rows
+
+	def aligned_row_lengths(self, width, shifts) :
+		"""
+		number of valid columns of aligned rows of width columns, for each shift ( see process_aligned ).
+		A window is valid when it ends before the padding of its shift : the row of shift s keeps the windows starting
+		before position len(sequence)-kernel_size+1-s, one column every hop positions.
+		hop and kernel_size are read from the keywords of convolution_F ( see functools.partial ).
+		Without hop, the width gives the number of windows and kernel_size is not needed.
+		"""
+		keywords = getattr( self.ConvolveSequence, "keywords", None ) or dict()
+		hop = keywords.get( "hop", 1 )
+		positions = width
+		if hop != 1 :
+			if "kernel_size" not in keywords :
+				raise ValueError("aligned processing with a hop requires convolution_F to be set up with kernel_size and hop keywords")
+			positions = len(self.aligned_sequence) - keywords["kernel_size"] + 1
+		return np.maximum( -( -(positions - np.asarray(shifts)) // hop ), 0 )
+
+	def process_spectrum(self, sequence) :
+		"""
+		FFT counterpart of process_vectorized for large shift ranges.
+		The identity of all shifts is computed at once by spectrum_F ( see SequenceOperations.windowed_period_spectrum ),
+		then scored. Columns are the windows of spectrum_F, thus they may be sparser than sequence positions.
+		returns a contiguous 2D array (one row per shift).
+		"""
+		if self.ComputeSpectrum is None :
+			raise ValueError("process_spectrum requires spectrum_F to be set at initialization")
+
+		with self.recording( "spectral autocorrelation protocol", len(sequence) ) as record :
+			sequence = self.run_stage( "encoding", self.EncodeSequence, sequence )
+			identity = self.apply_precision( self.run_stage( "spectrum", self.ComputeSpectrum, sequence ) )
+			output = np.ascontiguousarray( self.score(identity) )
+			record["shifts"] = len(output)
 		return output
 
+	def process_chunked(self, sequence, chunk_size, overlap, hop=1) :
+		"""
+		Streaming counterpart of process_vectorized for chromosome scale sequences.
+
+		The sequence is processed in overlapping tiles of chunk_size+overlap letters. Each tile is encoded,
+		compared, convolved and scored on its own, then the first chunk_size columns of its result are yielded.
+		Peak memory is thus bounded by the tile size instead of the sequence length.
+
+		Output column j depends on letters j to j+overlap-1, where overlap = kernel_size + max_shift
+		when using generate_shift_matrix with a valid mode convolution. With those settings,
+		concatenating the yielded blocks along axis 1 gives exactly the output of process_vectorized.
+
+		inputs :
+			- sequence (str or array) : the sequence to process
+			- chunk_size (int) : number of output columns computed per tile
+			- overlap (int) : number of letters shared by consecutive tiles, kernel_size + max_shift
+		- hop (int) : number of positions between computed columns, as set on convolution_F ( see SequenceOperations.moving_average ).
+		  chunk_size must be a multiple of hop, so that every tile starts on a computed column
+
+		yields :
+			- block (array) : result columns, with one row per shift
+		"""
+		if self.GenerateShiftMatrix is None :
+			raise ValueError("process_chunked requires shift_matrix_F to be set at initialization")
+		if chunk_size <= 0 :
+			raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+		if chunk_size % hop :
+			raise ValueError(f"chunk_size {chunk_size} must be a multiple of hop {hop}")
+
+		sequence_length = len(sequence)
+		with self.recording( f"chunked autocorrelation protocol with tiles of {chunk_size} columns", sequence_length ) as record :
+			tile_start = 0
+			while True :
+				tile_end = tile_start + chunk_size + overlap
+				block = self.process_shift_matrix( sequence[tile_start:tile_end] )
+				record["shifts"] = len(block)
+				if tile_end >= sequence_length :
+					yield np.ascontiguousarray( block )
+					break
+				yield np.ascontiguousarray( block[:, :chunk_size//hop] )
+				tile_start += chunk_size
+
+	def process_stitched(self, sequence, chunk_size, overlap, allocate=np.empty, hop=1) :
+		"""
+		gather the column blocks yielded by process_chunked (one column every hop positions) into a single matrix.
+		allocate(shape, dtype) is called once with the final shape, so that the matrix
+		can be backed by any buffer (shared memory, memory-mapped file...).
+		"""
+		output = None
+		column = 0
+		for block in self.process_chunked( sequence, chunk_size, overlap, hop ) :
+			if output is None :
+				output = allocate( (block.shape[0], -(-max(len(sequence)-overlap+1, 0) // hop)), block.dtype )
+			output[:, column:column+block.shape[1]] = block
+			column += block.shape[1]
+		return output
+
+	def process_screened(self, sequence, min_shift, max_shift, chunk_size, overlap, allocate=np.empty, hop=1) :
+		"""
+		Pruned counterpart of process_stitched for wide scans : only the cells selected by screen_F are computed.
+
+		The sequence is screened by windows of chunk_size positions ( see SequenceOperations.kmer_spacing_screen ).
+		Output columns are then processed by tiles of chunk_size columns as in process_chunked, shared between self.threads threads, and in each tile only the
+		candidate shifts of the windows the tile reads are computed, by runs of consecutive shifts with aligned_shift_matrix_F.
+		Skipped cells are left to NaN ( QUANTIZED_MISSING with uint8 precision ), computed cells hold exactly
+		the values of process_vectorized.
+
+		inputs :
+			- sequence (str or array) : the sequence to process
+			- min_shift, max_shift (int) : shift range, max_shift excluded, as set on shift_matrix_F
+			- chunk_size (int) : number of output columns per tile, and of positions per screened window
+			- overlap (int) : kernel_size + max_shift ( see process_chunked )
+			- allocate (callable) : allocate(shape, dtype) returns the output buffer (default np.empty)
+			- hop (int) : number of positions between computed columns, as set on convolution_F. chunk_size must be a multiple of hop
+
+		returns :
+			- output (array) : 2D array with one row per shift
+		"""
+		if self.ScreenSequence is None or self.GenerateAlignedShiftMatrix is None :
+			raise ValueError("process_screened requires screen_F and aligned_shift_matrix_F to be set at initialization")
+		if chunk_size <= 0 :
+			raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+		if chunk_size % hop :
+			raise ValueError(f"chunk_size {chunk_size} must be a multiple of hop {hop}")
+
+		width = max( len(sequence) - overlap + 1, 0 )
+		dtype, missing = self.missing_value( np.float64 if self.precision == "float64" else np.float32 )
+		output = allocate( (max_shift-min_shift, -(-width // hop)), dtype )
+		output[...] = missing
+
+		with self.recording( f"screened autocorrelation protocol with tiles of {chunk_size} columns", len(sequence) ) as record :
+			candidates = self.run_stage( "screening", self.ScreenSequence, sequence, min_shift, max_shift, chunk_size )
+			sequence = self.run_stage( "encoding", self.EncodeSequence, sequence )
+
+			def process_tile( tile_start ) :
+				tile_end = min( tile_start + chunk_size, width )
+				# column j reads positions j to j+overlap-1
+				shifts = np.flatnonzero( np.any( candidates[ tile_start//chunk_size : (tile_end+overlap-2)//chunk_size+1 ], axis=0 ) )
+				if len(shifts) == 0 :
+					return 0
+				# rows of the candidate shifts are gathered from the strided shift matrix, so that a tile is computed in one pass
+				tile = sequence[ tile_start : tile_end+overlap-1 ]
+				sequence_shifted, sequence_cropped = self.run_stage( "shift_generation", self.GenerateAlignedShiftMatrix, tile, min_shift+shifts[0], min_shift+shifts[-1]+1 )
+				rows = self.process_sequence_pair( sequence_shifted[ shifts-shifts[0] ], sequence_cropped )
+				columns = slice( tile_start//hop, -(-tile_end//hop) )
+				output[ shifts, columns ] = rows[ :, :columns.stop-columns.start ]
+				return len(shifts)
+
+			# tiles are small, thus threads share tiles instead of the shift rows of each tile
+			with ThreadPoolExecutor( max(self.threads, 1) ) as pool :
+				computed = sum( pool.map( process_tile, range(0, width, chunk_size) ) )
+			record["shifts"] = max_shift - min_shift
+			logging.info(f"screening computed {computed} tile x shift blocks out of {-(-width // chunk_size) * (max_shift-min_shift)}")
+		return output
+
+
+def _held_arrays( value ) :
+	"""
+	arrays of a stage input or output : the value itself, the items of a tuple or the array attributes of an object
+	such as SequenceEncoding.PackedSequence. Other values ( generators, numbers ) hold no array
+	"""
+	if isinstance(value, np.ndarray) :
+		return [ value ]
+	if isinstance(value, (tuple, list)) :
+		return [ array for item in value for array in _held_arrays(item) ]
+	return [ array for array in getattr(value, "__dict__", dict()).values() if isinstance(array, np.ndarray) ]
+
+
+def _memory_owner( array ) :
+	"""
+	array owning the memory of a view, following its chain of bases.
+	np.lib.stride_tricks.as_strided views have a helper object as base, holding the viewed array as its own base
+	"""
+	while True :
+		base = array.base
+		if not isinstance(base, np.ndarray) :
+			base = getattr( base, "base", None )
+		if not isinstance(base, np.ndarray) :
+			return array
+		array = base
+
+
+def _length_buckets( lengths, indices, max_padding, bucket_letters ) :
+	"""
+	split indices into buckets of sequences of similar lengths ( see AutoCorrelationEngine.process_batch ).
+	Within a bucket, the longest sequence is at most (1+max_padding) times longer than the shortest one,
+	and the padded bucket holds at most bucket_letters letters ( or a single sequence ).
+	"""
+	buckets = list()
+	bucket = list()
+	for index in indices[ np.argsort(lengths[indices], kind="stable") ] :
+		if bucket and ( lengths[index] > lengths[bucket[0]] * (1+max_padding) or (len(bucket)+1) * lengths[index] > bucket_letters ) :
+			buckets.append( bucket )
+			bucket = list()
+		bucket.append( index )
+	if bucket :
+		buckets.append( bucket )
+	return buckets
+
 
 if __name__ == "__main__" :
 
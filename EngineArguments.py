@@ -0,0 +1,47 @@
+
+from functools import partial
+
+from SequenceOperations import compute_code_identity, moving_average, transform_with_hill_sigmoid
+from SequenceOperations import windowed_period_spectrum, kmer_spacing_screen
+from SequenceOperations import compute_packed_identity, moving_average_packed
+from SubSequenceGenerator import generate_shifted_sequences, generate_shift_matrix, generate_aligned_shift_matrix
+from SubSequenceGenerator import generate_packed_shifted_sequences, generate_packed_shift_matrix
+from SequenceEncoding import integer_encoding, packed_encoding
+
+
+### ENGINE ARGUMENTS ###
+#
+# the AutoCorrelationEngine configuration shared by the command line ( main.py ) and the engine service ( EngineService.py ),
+# so that both compute the same matrices from the same parameters.
+
+
+def build_engine_arguments( min_shift, max_shift, kernel_size, midpoint, steepness, threads=1, precision="float64", hop=1, encoding="integer", screen_kmer=None ) :
+	"""
+	keyword arguments of the AutoCorrelationEngine run by the command line and by EngineService
+	"""
+	# convolution directly produces the floating type of the precision policy, scoring never allocates temporaries
+	engine_arguments = dict(
+		encoding_F    = integer_encoding,
+		comparison_F  = compute_code_identity,
+		convolution_F = partial(moving_average, kernel_size=kernel_size, convolution_mode="valid", dtype="float64" if precision == "float64" else "float32", hop=hop),
+		scoring_F     = partial(transform_with_hill_sigmoid, midpoint=midpoint, steepness=steepness, in_place=True ),
+		generator_F   = partial(generate_shifted_sequences, min_shift=min_shift, max_shift=max_shift),
+		shift_matrix_F = partial(generate_shift_matrix, min_shift=min_shift, max_shift=max_shift),
+		threads       = threads,
+		precision     = precision,
+		spectrum_F    = partial(windowed_period_spectrum, min_shift=min_shift, max_shift=max_shift, window_size=kernel_size, hop=hop),
+		aligned_shift_matrix_F = generate_aligned_shift_matrix,
+		screen_F      = None if screen_kmer is None else partial(kmer_spacing_screen, k=screen_kmer),
+	)
+	if encoding == "packed" :
+		engine_arguments.update(
+			encoding_F    = packed_encoding,
+			comparison_F  = compute_packed_identity,
+			convolution_F = partial(moving_average_packed, **engine_arguments["convolution_F"].keywords),
+			generator_F   = partial(generate_packed_shifted_sequences, min_shift=min_shift, max_shift=max_shift),
+			shift_matrix_F = partial(generate_packed_shift_matrix, min_shift=min_shift, max_shift=max_shift),
+			spectrum_F    = None,
+			aligned_shift_matrix_F = None,
+			screen_F      = None,
+		)
+	return engine_arguments
@@ -0,0 +1,110 @@
+
+from time import perf_counter
+from threading import Lock
+import logging
+import json
+import csv
+import sys
+
+from AbstractAutoCorrelationEngine import AutoCorrelationEngine
+
+
+def peak_rss_bytes() :
+	"""
+	peak resident set size of the current process in bytes, None where the resource module is unavailable (Windows)
+	"""
+	try :
+		import resource
+	except ImportError :
+		return None
+	peak = resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss
+	return peak if sys.platform == "darwin" else peak * 1024 # kilobytes on Linux, bytes on macOS
+
+
+class EngineProfiler() :
+	"""
+	Instrumentation hook for AutoCorrelationEngine ( see AutoCorrelationEngine.add_hook ).
+
+	One record is kept per process method call, reporting :
+		- sequence_length, shifts : the sequence length and the number of shift rows computed
+		- seconds : wall time of the call
+		- <stage>_seconds and <stage>_calls : time spent in each stage of the protocol and number of calls
+		- bytes_allocated : total size of the memory allocated by stages for their outputs, views and in place results not counted
+		- peak_rss_bytes : peak resident memory of the process when the call returned
+
+	When the engine runs with several threads, stage times of concurrent bands are summed, thus they can exceed the wall time.
+
+	The profiler can be used as a context manager, attaching itself to the engine for the duration of the block :
+
+		with EngineProfiler( auto_corr_worker ) as profiler :
+			auto_corr_worker.process_vectorized( sequence )
+		profiler.write( "profile.json" )
+	"""
+
+	def __init__( self, engine=None ) :
+		self.engine = engine
+		self.records = list()
+		self.current = None
+		self.lock = Lock()
+
+	def __enter__( self ) :
+		self.engine.add_hook( self )
+		return self
+
+	def __exit__( self, exception_type, exception, traceback ) :
+		self.engine.remove_hook( self )
+
+	### HOOK INTERFACE ###
+
+	def record_started( self, sequence_length ) :
+		self.current = dict( name=None, sequence_length=sequence_length, shifts=0, seconds=0.0 )
+		for stage in AutoCorrelationEngine.STAGES :
+			self.current[f"{stage}_seconds"] = 0.0
+			self.current[f"{stage}_calls"] = 0
+		self.current["bytes_allocated"] = 0
+		self.current["peak_rss_bytes"] = None
+		self.start = perf_counter()
+
+	def stage_done( self, stage, seconds, nbytes ) :
+		if self.current is None :
+			return
+		with self.lock :
+			self.current[f"{stage}_seconds"] += seconds
+			self.current[f"{stage}_calls"] += 1
+			self.current["bytes_allocated"] += nbytes
+
+	def record_done( self, sequence_length, shifts ) :
+		self.current["seconds"] = perf_counter() - self.start
+		self.current["shifts"] = shifts
+		self.current["peak_rss_bytes"] = peak_rss_bytes()
+		self.records.append( self.current )
+		self.current = None
+
+	### REPORT ###
+
+	def name_last_record( self, name ) :
+		"""
+		give a name (such as the sequence entry name) to the last record, if it has none yet
+		"""
+		if self.records and self.records[-1]["name"] is None :
+			self.records[-1]["name"] = name
+
+	def totals( self ) :
+		fields = [ "seconds", "bytes_allocated" ] + [ f"{stage}_seconds" for stage in AutoCorrelationEngine.STAGES ]
+		return { field : sum( record[field] for record in self.records ) for field in fields }
+
+	def write( self, file_path ) :
+		"""
+		write records to file_path, as CSV if its extension is .csv, as JSON otherwise
+		"""
+		logging.info(f"writing profiling report of {len(self.records)} records to {file_path}")
+		if file_path.endswith(".csv") :
+			with open( file_path, "w", newline="" ) as handle :
+				if self.records :
+					writer = csv.DictWriter( handle, fieldnames=list(self.records[0]) )
+					writer.writeheader()
+					writer.writerows( self.records )
+			return
+
+		with open( file_path, "w" ) as handle :
+			json.dump( dict(records=self.records, totals=self.totals()), handle, indent=1 )
@@ -0,0 +1,401 @@
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib import request as url_request, error as url_error
+from urllib.parse import urlparse, parse_qs, urlencode
+from collections import OrderedDict
+from time import perf_counter
+from threading import Lock
+import argparse
+import logging
+import json
+import sys
+import os
+
+import numpy as np
+
+from AbstractAutoCorrelationEngine import AutoCorrelationEngine
+from ResultCache import describe_function, pipeline_key
+from seq_io import IndexedFasta, yield_sequences
+from EngineArguments import build_engine_arguments
+
+
+### ENGINE SERVICE ###
+#
+# a long-running process keeping parsed records, encoded sequences and pre-scoring matrices in memory,
+# so that repeated queries (such as tuning sigmoid parameters from a notebook) skip interpreter startup,
+# imports, parsing, encoding and, when only scoring parameters change, comparison and convolution.
+# Requests go through HTTP on the local host : GET /records lists record names, POST /autocorrelation
+# takes a JSON document and returns the raw C-ordered buffer of the matrix, its dtype and shape being sent as headers.
+
+DEFAULT_PORT = 8765
+ENCODINGS = ( "integer", "packed" )
+
+
+def _nbytes( value ) :
+	"""
+	memory held by an array or by the arrays of an object such as SequenceEncoding.PackedSequence
+	"""
+	if isinstance(value, np.ndarray) :
+		return value.nbytes
+	return sum( array.nbytes for array in vars(value).values() if isinstance(array, np.ndarray) )
+
+
+def check_parameters( parameters ) :
+	"""
+	check the types and ranges of request parameters ( see EngineService.PARAMETERS ), before any engine is built
+
+	raises :
+		- ValueError -> invalid parameter
+	"""
+	for key in ( "min_shift", "max_shift", "kernel_size", "hop" ) :
+		# bool is a subclass of int, JSON true must not pass for 1
+		if not isinstance(parameters[key], int) or isinstance(parameters[key], bool) :
+			raise ValueError(f"{key} must be an integer, got {parameters[key]!r}")
+	for key in ( "midpoint", "steepness" ) :
+		if not isinstance(parameters[key], (int, float)) or isinstance(parameters[key], bool) :
+			raise ValueError(f"{key} must be a number, got {parameters[key]!r}")
+	if parameters["kernel_size"] < 1 or parameters["hop"] < 1 :
+		raise ValueError("kernel_size and hop must be at least 1")
+	if not 0 <= parameters["min_shift"] < parameters["max_shift"] :
+		raise ValueError(f"shifts must satisfy 0 <= min_shift < max_shift, got {parameters['min_shift']} and {parameters['max_shift']}")
+	if parameters["precision"] not in AutoCorrelationEngine.PRECISIONS :
+		raise ValueError(f"unknown precision {parameters['precision']!r}, expected one of {', '.join(AutoCorrelationEngine.PRECISIONS)}")
+	if parameters["encoding"] not in ENCODINGS :
+		raise ValueError(f"unknown encoding {parameters['encoding']!r}, expected one of {', '.join(ENCODINGS)}")
+
+
+class MemoryCache() :
+	"""
+	In-memory counterpart of ResultCache : values are bounded in total size, least recently used values being evicted first.
+	Keys are JSON serializable objects. Access is thread safe.
+	"""
+
+	def __init__( self, max_bytes=4*2**30 ) :
+		self.max_bytes = max_bytes
+		self.entries = OrderedDict()
+		self.size = 0
+		self.lock = Lock()
+
+	def get( self, kind, key ) :
+		"""
+		returns the value stored under kind and key, None if missing
+		"""
+		key = json.dumps( [kind, key] )
+		with self.lock :
+			if key not in self.entries :
+				return None
+			self.entries.move_to_end( key )
+			return self.entries[key][0]
+
+	def put( self, kind, key, value ) :
+		key = json.dumps( [kind, key] )
+		nbytes = _nbytes( value )
+		with self.lock :
+			if key in self.entries :
+				self.size -= self.entries.pop( key )[1]
+			self.entries[key] = ( value, nbytes )
+			self.size += nbytes
+			# the newest value is always kept, even alone above max_bytes
+			while self.size > self.max_bytes and len(self.entries) > 1 :
+				_, ( _, evicted_bytes ) = self.entries.popitem( last=False )
+				self.size -= evicted_bytes
+
+
+class EngineService() :
+	"""
+	AutoCorrelationEngine kept warm between requests.
+
+	Records, encoded sequences and pre-scoring matrices ( see AutoCorrelationEngine.convolve_shift_matrix ) are kept in a MemoryCache.
+	Records are identified by file path and modification time, so that an edited file is read again.
+	Pre-scoring matrices are keyed like ResultCache entries : a request changing only midpoint or steepness is only scored.
+
+	A request (dict) holds :
+		- name or region (str) : record name, or chrom:start-end region of an indexed FASTA file
+		- file (str) : path to the sequence file (default = file_path given at initialization)
+		- file_format (str) : format of the sequence file (default = file_format given at initialization)
+		- any of PARAMETERS, defaults being those of the command line
+
+	inputs :
+		- file_path (str) : default sequence file of requests
+		- file_format (str) : default format (default = fasta)
+		- max_bytes (int) : memory cache size (default = 4 GB)
+		- threads (int) : threads of each engine ( see AutoCorrelationEngine )
+	"""
+
+	PARAMETERS = dict( min_shift=1, max_shift=40, kernel_size=120, midpoint=0.5, steepness=20, precision="float64", hop=1, encoding="integer" )
+
+	def __init__( self, file_path=None, file_format="fasta", max_bytes=4*2**30, threads=1 ) :
+		self.file_path = file_path
+		self.file_format = file_format
+		self.cache = MemoryCache( max_bytes )
+		self.threads = threads
+		self.fasta_files = dict()
+
+	def source( self, file_path, file_format ) :
+		file_path = file_path or self.file_path
+		if file_path is None :
+			raise ValueError("no sequence file given, neither by the request nor at service start")
+		file_path = os.path.abspath( file_path )
+		return [ file_path, os.stat(file_path).st_mtime_ns, file_format or self.file_format ]
+
+	def fasta( self, source ) :
+		"""
+		IndexedFasta of a source, opened once per modification time. None for other formats and
+		FASTA files the index can not describe, which are parsed as by seq_io.yield_sequences
+		"""
+		file_path, modification_time, file_format = source
+		if file_format != "fasta" :
+			return None
+		if self.fasta_files.get( file_path, (None,) )[0] != modification_time :
+			try :
+				fasta = IndexedFasta( file_path )
+			except ValueError as error :
+				logging.warning(f"{error}, falling back to Biopython parsing")
+				fasta = None
+			self.fasta_files[file_path] = ( modification_time, fasta )
+		return self.fasta_files[file_path][1]
+
+	def records( self, file_path=None, file_format=None ) :
+		"""
+		returns the names of the records of a sequence file (list[str])
+		"""
+		source = self.source( file_path, file_format )
+		names = self.cache.get( "records", source )
+		if names is None :
+			fasta = self.fasta( source )
+			if fasta is not None :
+				names = fasta.names()
+			else :
+				names = [ name for name, _ in yield_sequences( source[0], source[2] ) ]
+			self.cache.put( "records", source, np.array(names, dtype=object) )
+		return list( names )
+
+	def sequence( self, source, name=None, region=None ) :
+		"""
+		returns the letters of a record or a region, read on cache miss only
+		"""
+		sequence = self.cache.get( "sequence", source + [name, region] )
+		if sequence is not None :
+			return sequence
+
+		fasta = self.fasta( source )
+		if region is not None :
+			if fasta is None :
+				raise ValueError("regions require an indexed FASTA file")
+			sequence = np.array( fasta.fetch_region(region) )
+		elif fasta is not None :
+			if name not in fasta.index :
+				raise KeyError(f"{name} is not a record of {source[0]}")
+			sequence = np.array( fasta.fetch(name) )
+		else :
+			sequence = next( ( np.frombuffer(letters.encode("ascii"), dtype=np.uint8) for record_name, letters in yield_sequences(source[0], source[2]) if record_name == name ), None )
+			if sequence is None :
+				raise KeyError(f"{name} is not a record of {source[0]}")
+		self.cache.put( "sequence", source + [name, region], sequence )
+		return sequence
+
+	def autocorrelation( self, request ) :
+		"""
+		compute the autocorrelation matrix described by a request
+
+		returns :
+			- output (array) : 2D array, one row per shift
+			- reused (str) : the most advanced cached result reused, one of convolved, encoded, sequence or none
+
+		raises :
+			- ValueError -> unknown or invalid parameter, missing record name
+			- KeyError -> unknown record
+		"""
+		if not isinstance(request, dict) :
+			raise ValueError("a request must be a JSON object")
+		request = dict( request )
+		source = self.source( request.pop("file", None), request.pop("file_format", None) )
+		name, region = request.pop("name", None), request.pop("region", None)
+		if (name is None) == (region is None) :
+			raise ValueError("a request needs either a record name or a region")
+		unknown = set(request) - set(self.PARAMETERS)
+		if unknown :
+			raise ValueError(f"unknown parameters {', '.join(sorted(unknown))}, expected {', '.join(self.PARAMETERS)}")
+		parameters = dict( self.PARAMETERS, **request )
+		check_parameters( parameters )
+
+		auto_corr_worker = AutoCorrelationEngine( **build_engine_arguments(
+			parameters["min_shift"], parameters["max_shift"], parameters["kernel_size"], parameters["midpoint"], parameters["steepness"],
+			self.threads, parameters["precision"], parameters["hop"], parameters["encoding"]
+		) )
+		record_key = source + [name, region]
+		encoded_key = record_key + [ describe_function(auto_corr_worker.EncodeSequence) ]
+		convolved_key = record_key + pipeline_key( auto_corr_worker )
+
+		reused = "convolved"
+		convolved = self.cache.get( "convolved", convolved_key )
+		if convolved is None :
+			encoded = self.cache.get( "encoded", encoded_key )
+			reused = "encoded"
+			if encoded is None :
+				reused = "sequence" if self.cache.get( "sequence", record_key ) is not None else "none"
+				encoded = auto_corr_worker.EncodeSequence( self.sequence(source, name, region) )
+				self.cache.put( "encoded", encoded_key, encoded )
+			convolved = auto_corr_worker.convolve_shift_matrix( encoded )
+			self.cache.put( "convolved", convolved_key, convolved )
+		# scoring works in place, the cached matrix is kept intact
+		return np.ascontiguousarray( auto_corr_worker.score(convolved.copy()) ), reused
+
+	### HTTP ###
+
+	def handler( self ) :
+		service = self
+
+		class Handler( BaseHTTPRequestHandler ) :
+
+			def reply( self, status, body, content_type="application/json", headers=() ) :
+				self.send_response( status )
+				self.send_header( "Content-Type", content_type )
+				self.send_header( "Content-Length", str(len(body)) )
+				for header, value in headers :
+					self.send_header( header, value )
+				self.end_headers()
+				self.wfile.write( body )
+
+			def fail( self, status, error ) :
+				# KeyError quotes its message
+				message = error.args[0] if isinstance(error, KeyError) and error.args else str(error)
+				if status >= 500 :
+					message = f"{type(error).__name__} : {message}"
+				self.reply( status, json.dumps( dict(error=message) ).encode() )
+
+			def do_GET( self ) :
+				url = urlparse( self.path )
+				if url.path != "/records" :
+					return self.fail( 404, f"unknown path {url.path}" )
+				query = { key : values[0] for key, values in parse_qs(url.query).items() }
+				try :
+					names = service.records( query.get("file"), query.get("file_format") )
+				except ( ValueError, KeyError, OSError ) as error :
+					return self.fail( 400, error )
+				except Exception as error :
+					logging.exception(f"failed to list records of {query.get('file')}")
+					return self.fail( 500, error )
+				self.reply( 200, json.dumps(names).encode() )
+
+			def do_POST( self ) :
+				if urlparse( self.path ).path != "/autocorrelation" :
+					return self.fail( 404, f"unknown path {self.path}" )
+				start = perf_counter()
+				try :
+					request = json.loads( self.rfile.read( int(self.headers.get("Content-Length", 0)) ) )
+					output, reused = service.autocorrelation( request )
+				except ( ValueError, KeyError, OSError ) as error :
+					return self.fail( 400, error )
+				except Exception as error :
+					# the client always gets an answer, instead of a closed connection
+					logging.exception(f"failed to serve {self.path}")
+					return self.fail( 500, error )
+				seconds = perf_counter() - start
+				logging.info(f"served {request.get('name') or request.get('region')} {output.shape} in {seconds:.3f} seconds, reusing {reused}")
+				headers = [ ("X-Dtype", output.dtype.str), ("X-Shape", ",".join(map(str, output.shape))), ("X-Seconds", f"{seconds:.6f}"), ("X-Reused", reused) ]
+				# matrices without columns have no buffer to cast ( memoryview.cast rejects zero-size views )
+				self.reply( 200, memoryview(output).cast("B") if output.size else b"", "application/octet-stream", headers )
+
+			def log_message( self, format, *arguments ) :
+				logging.debug( format % arguments )
+
+		return Handler
+
+	def serve( self, host="127.0.0.1", port=DEFAULT_PORT ) :
+		"""
+		answer requests until interrupted. Any local process can reach the service and make it read files, bind to the local host only.
+		"""
+		server = ThreadingHTTPServer( (host, port), self.handler() )
+		logging.info(f"engine service listening on http://{host}:{port}")
+		try :
+			server.serve_forever()
+		except KeyboardInterrupt :
+			logging.info("engine service stopped")
+		finally :
+			server.server_close()
+
+
+### CLIENT ###
+
+class EngineClient() :
+	"""
+	Thin client of a running EngineService :
+
+		client = EngineClient( "http://127.0.0.1:8765" )
+		for name in client.records( "genome.fasta" ) :
+			matrix = client.autocorrelation( name=name, file="genome.fasta", max_shift=200, steepness=30 )
+
+	File paths are made absolute, since the service may run from another directory.
+	Invalid requests reported by the service are raised as ValueError, failures of the service itself as RuntimeError.
+	"""
+
+	def __init__( self, url=f"http://127.0.0.1:{DEFAULT_PORT}", timeout=None ) :
+		self.url = url.rstrip("/")
+		self.timeout = timeout
+
+	def open( self, path, body=None ) :
+		"""
+		returns the response body and headers
+		"""
+		data = None if body is None else json.dumps( body ).encode()
+		try :
+			with url_request.urlopen( url_request.Request(self.url + path, data=data), timeout=self.timeout ) as response :
+				return response.read(), response.headers
+		except url_error.HTTPError as error :
+			try :
+				message = json.loads( error.read() ).get( "error", str(error) )
+			except ValueError :
+				message = str( error )
+			if error.code >= 500 :
+				raise RuntimeError( f"engine service failed : {message}" ) from None
+			raise ValueError( message ) from None
+
+	def records( self, file=None, file_format=None ) :
+		query = { key : value for key, value in ( ("file", file and os.path.abspath(file)), ("file_format", file_format) ) if value is not None }
+		return json.loads( self.open( "/records?" + urlencode(query) )[0] )
+
+	def autocorrelation( self, **request ) :
+		"""
+		request the autocorrelation matrix of a record ( see EngineService for request keys ).
+		The matrix is a read-only view of the received buffer.
+		"""
+		if request.get("file") is not None :
+			request["file"] = os.path.abspath( request["file"] )
+		body, headers = self.open( "/autocorrelation", request )
+		shape = tuple( int(length) for length in headers["X-Shape"].split(",") if length )
+		return np.frombuffer( body, dtype=headers["X-Dtype"] ).reshape( shape )
+
+
+def yield_service_results( client, file_path, file_format, region=None, **parameters ) :
+	"""
+	yield (name, autocorrelation matrix) pairs for the records of a file (or a single region) computed by a running EngineService
+	"""
+	if region is not None :
+		yield region, client.autocorrelation( region=region, file=file_path, file_format=file_format, **parameters )
+		return
+	for name in client.records( file_path, file_format ) :
+		logging.info(f"Requesting AutoCorrelation of {name}")
+		yield name, client.autocorrelation( name=name, file=file_path, file_format=file_format, **parameters )
+
+
+if __name__ == "__main__" :
+
+	logging.basicConfig(
+		level=logging.INFO,
+		format="%(asctime)s - %(filename)s - %(levelname)s - %(message)s",
+		handlers=[
+			logging.StreamHandler(sys.stdout)
+		]
+	)
+
+	parser = argparse.ArgumentParser( description="keep an AutoCorrelationEngine running, see main.py --server for the client" )
+	parser.add_argument( "-f", "--file", default=None, type=str, help="default sequence file of requests" )
+	parser.add_argument( "-ff", "--file_format", default="fasta", type=str, help="default format of the sequence file" )
+	parser.add_argument( "-H", "--host", default="127.0.0.1", type=str, help="address to listen on (default=127.0.0.1, local only)" )
+	parser.add_argument( "-P", "--port", default=DEFAULT_PORT, type=int, help=f"port to listen on (default={DEFAULT_PORT})" )
+	parser.add_argument( "-m", "--memory", default=4.0, type=float, help="size of the in-memory cache in GB (default=4)" )
+	parser.add_argument( "-t", "--threads", default=1, type=int, help="threads of each engine run (default=1)" )
+	args = parser.parse_args()
+
+	EngineService( args.file, args.file_format, int(args.memory * 2**30), args.threads ).serve( args.host, args.port )
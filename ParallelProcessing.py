@@ -0,0 +1,127 @@
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+from collections import deque
+from functools import partial
+import logging
+import numpy as np
+
+from AbstractAutoCorrelationEngine import AutoCorrelationEngine
+from result_io import open_result_matrix, result_path
+
+
+### WORKER SIDE ###
+#
+# each worker process builds its own AutoCorrelationEngine once, at pool initialization.
+# results are written into shared memory blocks (or memory-mapped result files) and only their names travel back to the parent process.
+
+_worker_engine = None
+
+def _initialize_worker( engine_arguments ) :
+	global _worker_engine
+	_worker_engine = AutoCorrelationEngine( **engine_arguments )
+
+
+def _create_shared_memory( size ) :
+	"""
+	create a shared memory block that outlives the worker process.
+	The block is not tracked by the worker resource tracker since the parent process is in charge of unlinking it.
+	"""
+	try :
+		return shared_memory.SharedMemory( create=True, size=max(size,1), track=False )
+	except TypeError :
+		# python < 3.13 has no track argument
+		block = shared_memory.SharedMemory( create=True, size=max(size,1) )
+		resource_tracker.unregister( block._name, "shared_memory" )
+		return block
+
+
+def _process_record( name, sequence, chunk_size, overlap, output_directory, hop ) :
+	blocks = list()
+
+	def allocate_shared( shape, dtype ) :
+		block = _create_shared_memory( int(np.prod(shape)) * np.dtype(dtype).itemsize )
+		blocks.append( block )
+		return np.ndarray( shape, dtype=dtype, buffer=block.buf )
+
+	if output_directory is None :
+		allocate = allocate_shared
+	else :
+		allocate = partial( open_result_matrix, output_directory, name )
+
+	if chunk_size is None :
+		output = _worker_engine.process_vectorized( sequence, allocate=allocate )
+	else :
+		output = _worker_engine.process_stitched( sequence, chunk_size, overlap, allocate=allocate, hop=hop )
+
+	shape, dtype = output.shape, output.dtype.str
+	del output
+	if output_directory is not None :
+		return name, None, shape, dtype
+	blocks[0].close()
+	return name, blocks[0].name, shape, dtype
+
+
+### PARENT SIDE ###
+
+def _collect_record( output_directory, name, block_name, shape, dtype ) :
+	"""
+	copy a worker result out of its shared memory block, then release the block.
+	results written to a memory-mapped file are opened read-only instead.
+	"""
+	if block_name is None :
+		return name, np.load( result_path(output_directory, name, "npy"), mmap_mode="r" )
+
+	block = shared_memory.SharedMemory( name=block_name )
+	try :
+		output = np.ndarray( shape, dtype=dtype, buffer=block.buf ).copy()
+	finally :
+		block.close()
+		block.unlink()
+	return name, output
+
+
+def process_records( records, engine_arguments, workers, chunk_size=None, overlap=None, output_directory=None, max_pending=None, hop=1 ) :
+	"""
+	Run AutoCorrelationEngine over sequence records on a pool of worker processes.
+
+	Records are submitted ahead of consumption (up to max_pending at once), so that a single huge
+	record only occupies one worker while the following small ones keep being processed.
+	Results are yielded in input order. Result matrices are returned through shared memory instead
+	of being pickled, or written by workers straight to memory-mapped files if output_directory is set
+	( see result_io.open_result_matrix ).
+
+	inputs :
+		- records (iterable) : (name, sequence) pairs, see seq_io.yield_sequences
+		- engine_arguments (dict) : keyword arguments for AutoCorrelationEngine. Functions must be picklable (use functools.partial on module functions)
+		- workers (int) : number of worker processes
+		- chunk_size (int) : if set, records are processed with AutoCorrelationEngine.process_stitched (see process_chunked)
+		- overlap (int) : tile overlap for chunked processing, kernel_size + max_shift
+		- output_directory (str) : if set, workers write results to <output_directory>/<name>.npy and read-only memory maps are yielded
+		- max_pending (int) : maximum number of submitted records not yet yielded (default = 4 x workers)
+		- hop (int) : number of positions between computed columns, for chunked processing
+
+	yields :
+		- name (str) : the name of the record
+		- output (array) : the autocorrelation matrix of the record
+	"""
+	if max_pending is None :
+		max_pending = 4 * workers
+
+	logging.info(f"starting process pool with {workers} workers")
+	with ProcessPoolExecutor( max_workers=workers, initializer=_initialize_worker, initargs=(engine_arguments,) ) as pool :
+		pending = deque()
+		try :
+			for name, sequence in records :
+				pending.append( pool.submit(_process_record, name, sequence, chunk_size, overlap, output_directory, hop) )
+				if len(pending) >= max_pending :
+					yield _collect_record( output_directory, *pending.popleft().result() )
+			while pending :
+				yield _collect_record( output_directory, *pending.popleft().result() )
+		finally :
+			# release shared memory of results that will never be consumed
+			for future in pending :
+				future.cancel()
+			for future in pending :
+				if not future.cancelled() and future.exception() is None :
+					_collect_record( output_directory, *future.result() )
@@ -0,0 +1,113 @@
+
+from threading import Thread, Event
+from queue import Queue, Full
+import logging
+import numpy as np
+
+
+### PIPELINE ###
+#
+# record processing is split into stages running concurrently, linked by bounded queues :
+#   (1) reading : records are parsed and their letters loaded in memory
+#   (2) computing : the engine turns records into autocorrelation matrices
+#   (3) writing : matrices are written, pooled, scanned for repeat regions or plotted by the consumer
+# A stage blocks when its output queue is full (backpressure), so that at most depth items wait between two stages
+# whatever the speed of the others. Numpy releases the GIL on large arrays and file reads, thus threads are enough.
+
+_DONE = object()
+
+
+class _Failure() :
+	"""
+	exception raised by a stage, handed over to the consuming stage to be raised again there
+	"""
+	def __init__( self, error ) :
+		self.error = error
+
+
+def _put( buffer, item, stop ) :
+	"""
+	put item in buffer, waiting for room until stop is set. returns False if the consumer stopped
+	"""
+	while not stop.is_set() :
+		try :
+			buffer.put( item, timeout=0.1 )
+			return True
+		except Full :
+			pass
+	return False
+
+
+def prefetch( items, depth=2, name="prefetch" ) :
+	"""
+	Iterate items in a background thread, running at most depth items ahead of the consumer.
+
+	Items are yielded in order. An exception raised while iterating items is raised again in the consumer.
+	When the consumer stops early (break, exception), the background thread stops at its next item.
+	Besides the depth items queued, the background thread holds the item it is producing.
+
+	inputs :
+		- items (iterable) : iterated in the background thread, for instance a generator running an engine
+		- depth (int) : maximal number of items waiting in the queue (default = 2)
+		- name (str) : name of the background thread, for logs
+
+	yields :
+		- item : items of the iterable
+	"""
+	buffer = Queue( maxsize=max(depth, 1) )
+	stop = Event()
+
+	def produce() :
+		try :
+			for item in items :
+				if not _put( buffer, item, stop ) :
+					return
+		except BaseException as error :
+			_put( buffer, _Failure(error), stop )
+			return
+		finally :
+			# stop upstream stages when the consumer stopped early
+			if hasattr(items, "close") :
+				items.close()
+		_put( buffer, _DONE, stop )
+
+	thread = Thread( target=produce, name=name, daemon=True )
+	thread.start()
+	try :
+		while True :
+			item = buffer.get()
+			if item is _DONE :
+				return
+			if isinstance(item, _Failure) :
+				raise item.error
+			yield item
+	finally :
+		stop.set()
+
+
+def load_records( records ) :
+	"""
+	yield (name, sequence) records with the letters of memory-mapped sequences ( see seq_io.IndexedFasta.fetch ) loaded in memory,
+	so that reading the file happens in the reading stage instead of page faults during computation
+	"""
+	for name, sequence in records :
+		if isinstance(sequence, np.ndarray) :
+			sequence = np.array( sequence )
+		yield name, sequence
+
+
+def pipeline_records( records, compute, depth=2 ) :
+	"""
+	Run compute over records with reading and computing in their own threads, the caller consuming results as the writing stage.
+
+	inputs :
+		- records (iterable) : (name, sequence) pairs, see seq_io.yield_sequences
+		- compute (callable) : takes an iterable of records and returns an iterable of results, for instance main.run_engine
+		- depth (int) : maximal number of records or results waiting between two stages (default = 2)
+
+	yields :
+		- results of compute, in order
+	"""
+	logging.info(f"pipelining reading, computing and writing with queues of {depth} items")
+	records = prefetch( load_records(records), depth, name="reading" )
+	return prefetch( compute(records), depth, name="computing" )
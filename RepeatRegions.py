@@ -0,0 +1,187 @@
+
+from collections import namedtuple
+import numpy as np
+
+from SequenceOperations import dequantize_scores
+
+
+### REPEAT REGIONS ###
+#
+# sparse view of an autocorrelation matrix : each shift row is turned into intervals of consecutive
+# columns scoring above a threshold, reported in sequence coordinates with the shift as repeat period.
+# Column j of a row holds the score of the window of kernel_size letters starting at j, compared with
+# the same window shifted by the row shift : the interval of columns [a,b) thus covers letters a to b-1+kernel_size-1+shift
+# (columns being multiplied by the hop when only one window every hop positions is computed).
+
+RepeatRegion = namedtuple( "RepeatRegion", ["chrom", "start", "end", "period", "mean_score", "max_score"] )
+
+
+def _find_runs( scores, threshold ) :
+	"""
+	find runs of consecutive columns scoring at least threshold in each row of scores (NaN never pass).
+
+	returns :
+		- rows, starts, ends (array[int]) : row and column interval [start,end) of each run, sorted by row then start
+		- sums, maxima (array[float]) : sum and maximum of the scores of each run
+	"""
+	passing = np.zeros( (scores.shape[0], scores.shape[1]+2), dtype=bool )
+	np.greater_equal( scores, threshold, out=passing[:, 1:-1] )
+	edges = np.diff( passing.view(np.int8), axis=1 )
+	rows, starts = np.nonzero( edges == 1 )
+	_, ends = np.nonzero( edges == -1 )
+
+	kept = np.where( passing[:, 1:-1], scores, 0 )
+	prefix = np.zeros( (scores.shape[0], scores.shape[1]+1) )
+	np.cumsum( kept, axis=1, out=prefix[:, 1:] )
+	sums = prefix[rows, ends] - prefix[rows, starts]
+
+	if len(rows) == 0 :
+		return rows, starts, ends, sums, sums.copy()
+	# maximum over each run with a single reduceat on the flattened scores, runs being [start,end) segments
+	kept[~passing[:, 1:-1]] = -np.inf
+	flat = np.append( kept.reshape(-1), -np.inf )
+	bounds = np.empty( 2*len(rows), dtype=np.intp )
+	bounds[0::2] = rows * scores.shape[1] + starts
+	bounds[1::2] = rows * scores.shape[1] + ends
+	maxima = np.maximum.reduceat( flat, bounds )[0::2]
+	return rows, starts, ends, sums, maxima
+
+
+class RepeatRegionExtractor() :
+	"""
+	Streaming extraction of repeat regions from the column blocks of an autocorrelation matrix
+	( see AutoCorrelationEngine.process_chunked ), so that the dense matrix is never held in full.
+
+	Within a row, runs of columns scoring at least threshold are merged when separated by at most max_gap positions
+	( ceil(max_gap/step) columns ).
+	Each merged interval gives one RepeatRegion, with the mean and maximum of the scores above threshold.
+	Intervals shorter than min_length columns are dropped.
+
+	An interval touching the end of the last block may continue in the next one, thus it is only emitted
+	once a later block ( or finish ) proves it closed. Regions are thus returned in closing order,
+	sort them once the sequence is done ( see sort_repeat_regions ) :
+
+		extractor = RepeatRegionExtractor( "chr1", range(1,40), threshold=0.5, kernel_size=120 )
+		for block in auto_corr_worker.process_chunked( sequence, chunk_size, overlap ) :
+			regions += extractor.consume( block )
+		regions = sort_repeat_regions( regions + extractor.finish() )
+
+	inputs :
+		- chrom (str) : sequence name reported in regions
+		- shifts (range) : the shift of each row
+		- threshold (float) : minimal score of columns in regions
+		- kernel_size (int) : convolution window, to convert columns into sequence coordinates
+		- max_gap (int) : maximal number of positions below threshold inside a region (default = 0)
+		- min_length (int) : minimal number of columns of a region (default = 1)
+		- offset (int) : sequence coordinate of column 0, for instance the start of a region (default = 0)
+		- step (int) : number of positions between columns, when the matrix was computed with a hop (default = 1)
+
+	uint8 blocks are taken as quantized scores ( see SequenceOperations.quantize_scores ).
+	"""
+
+	def __init__( self, chrom, shifts, threshold, kernel_size, max_gap=0, min_length=1, offset=0, step=1 ) :
+		self.chrom = chrom
+		self.shifts = np.asarray( shifts )
+		self.threshold = threshold
+		self.kernel_size = kernel_size
+		# in columns, one column every step positions
+		self.max_gap = -( -max_gap // step )
+		self.min_length = min_length
+		self.offset = offset
+		self.step = step
+		self.column = 0
+		self.pending = tuple( np.zeros(0, dtype=dtype) for dtype in (np.intp, np.intp, np.intp, float, float, np.intp) )
+
+	def consume( self, block ) :
+		"""
+		add the next column block (one row per shift) and return the regions closed so far (list[RepeatRegion])
+		"""
+		if block.dtype == np.uint8 :
+			block = dequantize_scores( block )
+		rows, starts, ends, sums, maxima = _find_runs( block, self.threshold )
+		runs = ( rows, starts+self.column, ends+self.column, sums, maxima, ends-starts )
+		self.column += block.shape[1]
+
+		# pending intervals of the previous block come first in their row
+		runs = [ np.concatenate(pair) for pair in zip(self.pending, runs) ]
+		order = np.lexsort( (runs[1], runs[0]) )
+		rows, starts, ends, sums, maxima, counts = [ values[order] for values in runs ]
+
+		# merge runs of a same row separated by at most max_gap columns
+		if len(rows) > 0 :
+			first = np.ones( len(rows), dtype=bool )
+			first[1:] = ( rows[1:] != rows[:-1] ) | ( starts[1:] - ends[:-1] > self.max_gap )
+			heads = np.flatnonzero( first )
+			tails = np.append( heads[1:], len(rows) ) - 1
+			rows, starts, ends = rows[heads], starts[heads], ends[tails]
+			sums, counts = np.add.reduceat( sums, heads ), np.add.reduceat( counts, heads )
+			maxima = np.maximum.reduceat( maxima, heads )
+
+		# intervals that can still be merged with the next block stay pending
+		is_open = ends + self.max_gap >= self.column
+		self.pending = tuple( values[is_open] for values in (rows, starts, ends, sums, maxima, counts) )
+		closed = ~is_open
+		return self.regions( rows[closed], starts[closed], ends[closed], sums[closed], maxima[closed], counts[closed] )
+
+	def finish( self ) :
+		"""
+		return the regions still pending after the last block (list[RepeatRegion])
+		"""
+		regions = self.regions( *self.pending )
+		self.pending = tuple( values[:0] for values in self.pending )
+		return regions
+
+	def regions( self, rows, starts, ends, sums, maxima, counts ) :
+		kept = ends - starts >= self.min_length
+		periods = self.shifts[ rows[kept] ]
+		sequence_starts = self.offset + starts[kept] * self.step
+		sequence_ends = self.offset + (ends[kept]-1) * self.step + self.kernel_size + periods
+		mean_scores = sums[kept] / counts[kept]
+		order = np.argsort( sequence_starts, kind="stable" )
+		return [
+			RepeatRegion( self.chrom, int(start), int(end), int(period), float(mean_score), float(max_score) )
+			for start, end, period, mean_score, max_score in zip(
+				sequence_starts[order], sequence_ends[order], periods[order], mean_scores[order], maxima[kept][order]
+			)
+		]
+
+
+def sort_repeat_regions( regions ) :
+	"""
+	sort regions of a sequence in place by start, end then period, the coordinate order expected in BED files
+	( bedtools, tabix ), and return them. The order does not depend on the blocks regions were extracted from
+	"""
+	regions.sort( key=lambda region : (region.start, region.end, region.period) )
+	return regions
+
+
+def extract_repeat_regions( matrix, chrom, shifts, threshold, kernel_size, max_gap=0, min_length=1, offset=0, step=1 ) :
+	"""
+	extract repeat regions from a whole autocorrelation matrix ( see RepeatRegionExtractor for arguments )
+
+	returns :
+		- regions (list[RepeatRegion]) : sorted by start, end then period
+	"""
+	extractor = RepeatRegionExtractor( chrom, shifts, threshold, kernel_size, max_gap, min_length, offset, step )
+	return sort_repeat_regions( extractor.consume( np.asarray(matrix) ) + extractor.finish() )
+
+
+def write_repeat_regions( handle, regions, file_format="bed" ) :
+	"""
+	write repeat regions to an open text file.
+
+	bed : BED6 lines, 0-based half-open coordinates. The name is period=<shift> and
+	      the score the maximum score scaled to 0-1000, as expected by genome browsers.
+	tsv : chrom, start, end, period, mean_score and max_score columns (same coordinates).
+	      A header line is written on empty files.
+	"""
+	if file_format == "bed" :
+		for region in regions :
+			handle.write( f"{region.chrom}\t{region.start}\t{region.end}\tperiod={region.period}\t{round(region.max_score*1000)}\t.\n" )
+	elif file_format == "tsv" :
+		if handle.tell() == 0 :
+			handle.write( "\t".join(RepeatRegion._fields) + "\n" )
+		for region in regions :
+			handle.write( f"{region.chrom}\t{region.start}\t{region.end}\t{region.period}\t{region.mean_score:.6g}\t{region.max_score:.6g}\n" )
+	else :
+		raise ValueError(f"unknown repeat region format {file_format}, expected bed or tsv")
@@ -0,0 +1,191 @@
+
+from functools import partial
+import numpy as np
+import hashlib
+import logging
+import json
+import os
+
+
+def describe_function( function ) :
+	"""
+	give a stable textual description of a pipeline function, including arguments fixed with functools.partial.
+	example : partial(moving_average, kernel_size=120) -> "SequenceOperations.moving_average(kernel_size=120)"
+	"""
+	if function is None :
+		return "None"
+	if isinstance(function, partial) :
+		arguments = [ repr(value) for value in function.args ]
+		arguments += [ f"{key}={value!r}" for key, value in sorted(function.keywords.items()) ]
+		return f"{describe_function(function.func)}({', '.join(arguments)})"
+	return f"{getattr(function, '__module__', '')}.{getattr(function, '__qualname__', repr(function))}"
+
+
+def sequence_digest( sequence ) :
+	"""
+	hash the letters of a sequence (str, bytes or uint8 array), without copying array views
+	"""
+	if isinstance(sequence, str) :
+		sequence = sequence.encode("ascii")
+	elif isinstance(sequence, np.ndarray) :
+		sequence = np.ascontiguousarray(sequence).view(np.uint8)
+	return hashlib.blake2b( sequence, digest_size=20 ).hexdigest()
+
+
+class ResultCache() :
+	"""
+	On-disk cache of arrays and small JSON documents, bounded in size with least recently used eviction.
+
+	Entries are grouped by kind (a sub-directory) and identified by a key, any JSON serializable object.
+	Each access refreshes the modification time of the entry file, which is then used as the LRU clock.
+	Once the cache exceeds max_bytes after a store, the least recently used entries are removed.
+
+	The cache is used by the command line for three kinds of entries :
+		- "records"   : names and digests of the sequences of an input file, so that re-runs skip parsing
+		- "encoded"   : encoded sequences, keyed by sequence digest and encoding function
+		- "convolved" : pre-scoring matrices, keyed by sequence digest, encoding, comparison, convolution and shift functions and precision
+	Since scoring is applied after the cache, changing the sigmoid parameters only re-runs scoring.
+	"""
+
+	def __init__( self, directory, max_bytes=4*2**30 ) :
+		self.directory = directory
+		self.max_bytes = max_bytes
+		os.makedirs( directory, exist_ok=True )
+
+	def path( self, kind, key, extension ) :
+		key_digest = hashlib.blake2b( json.dumps(key, sort_keys=True).encode(), digest_size=20 ).hexdigest()
+		return os.path.join( self.directory, kind, f"{key_digest}.{extension}" )
+
+	def _touch( self, path ) :
+		try :
+			os.utime( path )
+			return True
+		except FileNotFoundError :
+			return False
+
+	def load( self, kind, key ) :
+		"""
+		returns the array stored under kind and key, None if missing
+		"""
+		path = self.path( kind, key, "npy" )
+		if not self._touch(path) :
+			return None
+		logging.info(f"cache hit on {kind} entry {os.path.basename(path)}")
+		return np.load( path )
+
+	def store( self, kind, key, array ) :
+		path = self.path( kind, key, "npy" )
+		os.makedirs( os.path.dirname(path), exist_ok=True )
+		np.save( f"{path}.partial.npy", array )
+		os.replace( f"{path}.partial.npy", path )
+		self.evict()
+
+	def load_json( self, kind, key ) :
+		path = self.path( kind, key, "json" )
+		if not self._touch(path) :
+			return None
+		with open( path ) as handle :
+			return json.load( handle )
+
+	def store_json( self, kind, key, document ) :
+		path = self.path( kind, key, "json" )
+		os.makedirs( os.path.dirname(path), exist_ok=True )
+		with open( f"{path}.partial", "w" ) as handle :
+			json.dump( document, handle )
+		os.replace( f"{path}.partial", path )
+		self.evict()
+
+	def evict( self ) :
+		"""
+		remove least recently used entries until the cache fits in max_bytes
+		"""
+		entries = list()
+		for root, directories, files in os.walk( self.directory ) :
+			for file_name in files :
+				path = os.path.join( root, file_name )
+				status = os.stat( path )
+				entries.append( (status.st_mtime, status.st_size, path) )
+
+		total_size = sum( size for _, size, _ in entries )
+		for _, size, path in sorted(entries) :
+			if total_size <= self.max_bytes :
+				break
+			logging.info(f"cache eviction of {path}")
+			os.remove( path )
+			total_size -= size
+
+
+def pipeline_key( auto_corr_worker ) :
+	"""
+	describe what pre-scoring matrices of an AutoCorrelationEngine depend on :
+	encoding, comparison, convolution and shift functions and precision
+	"""
+	return [ describe_function(function) for function in (
+		auto_corr_worker.EncodeSequence,
+		auto_corr_worker.CompareSequences,
+		auto_corr_worker.ConvolveSequence,
+		auto_corr_worker.GenerateShiftMatrix,
+	) ] + [ auto_corr_worker.precision ]
+
+
+def yield_cached_results( cache, auto_corr_worker, source_key, read_records ) :
+	"""
+	Run the vectorized protocol of an AutoCorrelationEngine over records, reusing cached intermediate results.
+
+	inputs :
+		- cache (ResultCache)
+		- auto_corr_worker (AutoCorrelationEngine) : engine with shift_matrix_F set
+		- source_key (JSON serializable) : identifies the input records ( see file_source_key )
+		- read_records (callable) : no argument, returns an iterable of (name, sequence). Only called on cache miss.
+
+	yields :
+		- name (str) the name of the entry
+		- output (array) the autocorrelation matrix of the entry
+	"""
+	encoding = describe_function( auto_corr_worker.EncodeSequence )
+	pipeline = pipeline_key( auto_corr_worker )
+
+	def encode( sequence, digest ) :
+		encoded = auto_corr_worker.EncodeSequence( sequence )
+		cache.store( "encoded", [digest, encoding], encoded )
+		return encoded
+
+	def process( name, digest, get_encoded ) :
+		convolved = cache.load( "convolved", [digest] + pipeline )
+		if convolved is None :
+			convolved = auto_corr_worker.convolve_shift_matrix( get_encoded() )
+			cache.store( "convolved", [digest] + pipeline, convolved )
+		return name, np.ascontiguousarray( auto_corr_worker.score(convolved) )
+
+	def reparse( name ) :
+		for record_name, sequence in read_records() :
+			if record_name == name :
+				return sequence
+		raise KeyError(f"{name} is no longer in the input records")
+
+	manifest = cache.load_json( "records", source_key )
+	if manifest is None :
+		manifest = list()
+		for name, sequence in read_records() :
+			digest = sequence_digest( sequence )
+			manifest.append( [name, digest] )
+			yield process( name, digest, partial(encode, sequence, digest) )
+		cache.store_json( "records", source_key, manifest )
+		return
+
+	logging.info(f"input records found in cache, skipping parsing")
+	for name, digest in manifest :
+		def get_encoded() :
+			encoded = cache.load( "encoded", [digest, encoding] )
+			if encoded is None :
+				encoded = encode( reparse(name), digest )
+			return encoded
+		yield process( name, digest, get_encoded )
+
+
+def file_source_key( file_path, file_format, region=None ) :
+	"""
+	identify the content of a sequence file from its path, size and modification time
+	"""
+	status = os.stat( file_path )
+	return [ os.path.abspath(file_path), status.st_size, status.st_mtime_ns, file_format, region ]
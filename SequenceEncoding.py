@@ -1,7 +1,7 @@
 import numpy as np
 import logging
 
-def one_hot_encoding( sequence ) :
+def one_hot_encoding( sequence, dtype=np.float64 ) :
 	"""
 	One-Hot Sequence Encoding transform a sequence of letters into a sequence of vectors.
 
@@ -24,6 +24,8 @@ def one_hot_encoding( sequence ) :
 
 	inputs :
 		- sequence (str) : the sequence to encode with One-Hot
+		- dtype (dtype) : type of vector components (default = float64). With float32, comparison by
+		  compute_sequence_identity also runs in float32, on half the memory
 
 	returns :
 		- vectorized_sequence (array[array]) : the vectorized sequence
@@ -45,11 +47,152 @@ def one_hot_encoding( sequence ) :
 	# Build the unit vectors library for easy encoding based on dictionnary accession
 	unit_vectors = dict()
 	for i, letter in enumerate(letters) :
-		vector = np.zeros( dimensions )
+		vector = np.zeros( dimensions, dtype=dtype )
 		vector[i] += 1
 		unit_vectors[letter] = vector
 
 	# Perform letter encoding
-	sequence_vectorized = np.array( [ unit_vectors[letter] for letter in sequence ] )
+	sequence_vectorized = np.array( [ unit_vectors[letter] for letter in sequence ], dtype=dtype )
 	logging.info(f"Sequence successfully encoded, new shape -> {sequence_vectorized.shape}")
-	return sequence_vectorized
\ No newline at end of file
+	return sequence_vectorized
+
+def integer_encoding( sequence ) :
+	"""
+	Integer Sequence Encoding transform a sequence of letters into a sequence of small integer codes.
+
+	Each different letter present in the sequence is given a code between 0 and n-1, where n corresponds
+	to the number of different letters that are present in the sequence of interest.
+	Codes are stored as uint8, meaning that a letter costs a single byte instead of n float64 values
+	with one_hot_encoding. Two positions hold the same letter if and only if their codes are equal,
+	which is what SequenceOperations.compute_code_identity relies on.
+
+	Encoding is carried out with a 256 entries lookup table indexed by the byte value of each letter,
+	so that no python loop is performed over the sequence.
+
+	** Warning 1 : as for one_hot_encoding, U and T are considered different letters and letters are case-sensitive.
+
+	** Warning 2 : letters must be single byte characters (ASCII), which is the case for nucleic acid and protein sequences.
+
+	inputs :
+		- sequence (str, bytes or array[uint8]) : the sequence to encode
+
+	returns :
+		- encoded_sequence (array[uint8]) : the integer encoded sequence
+
+	logging :
+		- info > prior encoding, indicates the sequence length and the number of different letters in it
+		- info > prior returns, indicates the shape of the output encoded sequence
+
+	raises :
+		- UnicodeEncodeError -> the sequence contains non ASCII letters
+	"""
+
+	# Get the byte value of each letter without iterating over the sequence
+	if isinstance(sequence, str) :
+		sequence = sequence.encode("ascii")
+	if isinstance(sequence, (bytes, bytearray, memoryview)) :
+		letters = np.frombuffer(sequence, dtype=np.uint8)
+	else :
+		letters = np.asarray(sequence, dtype=np.uint8)
+
+	# Build the lookup table : byte value -> letter code
+	present = np.zeros(256, dtype=bool)
+	present[letters] = True
+	dimensions = int(np.count_nonzero(present))
+	logging.info(f"Attempting to encode a sequence with integer codes. Sequence length is {len(letters)} and contains {dimensions} different letters")
+
+	lookup_table = np.zeros(256, dtype=np.uint8)
+	lookup_table[present] = np.arange(dimensions, dtype=np.uint8)
+
+	# Perform letter encoding
+	encoded_sequence = lookup_table[letters]
+	logging.info(f"Sequence successfully encoded, new shape -> {encoded_sequence.shape}")
+	return encoded_sequence
+
+
+### PACKED NUCLEOTIDES ###
+#
+# DNA letters are stored on 2 bits, 32 bases per 64-bit word : base i lays at bits 2*(i%32) and 2*(i%32)+1 of word i//32.
+# Letters other than A, C, G and T (N and IUPAC ambiguity codes) are stored as A and flagged invalid in a side mask.
+
+class PackedSequence() :
+	"""
+	2-bit packed nucleotide sequence ( see packed_encoding ).
+
+	attributes :
+		- words (array[uint64]) : packed bases, 1D or 2D (one packed sequence per row, such as a shift matrix)
+		- length (int) : number of bases of each packed sequence
+		- mask (array[uint64] or None) : same layout as words, the lowest bit of a base being set when the base is valid
+
+	Like arrays, len() gives the number of bases of a 1D packed sequence and the number of rows of a 2D one,
+	and indexing selects rows, so that packed shift matrices can be split into bands by AutoCorrelationEngine.
+	"""
+
+	def __init__( self, words, length, mask=None ) :
+		self.words = words
+		self.length = length
+		self.mask = mask
+
+	def __len__( self ) :
+		if self.words.ndim == 1 :
+			return self.length
+		return len(self.words)
+
+	def __getitem__( self, index ) :
+		return PackedSequence( self.words[index], self.length, None if self.mask is None else self.mask[index] )
+
+
+def _pack_2bit( values ) :
+	"""
+	pack 2-bit values (uint8 array, length multiple of 32) into little-endian uint64 words
+	"""
+	quads = values.reshape( -1, 4 )
+	packed = quads[:,0] | (quads[:,1] << 2) | (quads[:,2] << 4) | (quads[:,3] << 6)
+	return packed.view("<u8").astype( np.uint64, copy=False )
+
+
+def packed_encoding( sequence ) :
+	"""
+	2-bit Packed Nucleotide Encoding transform a DNA sequence into 64-bit words holding 32 bases each.
+
+	A base costs 2 bits instead of a byte with integer_encoding (or 32 bytes with one_hot_encoding on 4 letters),
+	which divides by 4 the memory traffic of the comparison step ( see SequenceOperations.compute_packed_identity ).
+
+	A, C, G and T are given codes 0 to 3, lower case letters (soft-masked regions) are read as upper case and U as T.
+	Any other letter (N, IUPAC ambiguity codes) is flagged in a side mask and never counted as identical to any base.
+
+	** Warning : unlike integer_encoding, the alphabet is fixed. Protein sequences can not be packed.
+
+	inputs :
+		- sequence (str, bytes or array[uint8]) : the sequence to encode
+
+	returns :
+		- packed_sequence (PackedSequence) : words and validity mask of the sequence
+
+	raises :
+		- UnicodeEncodeError -> the sequence contains non ASCII letters
+	"""
+	if isinstance(sequence, str) :
+		sequence = sequence.encode("ascii")
+	if isinstance(sequence, (bytes, bytearray, memoryview)) :
+		letters = np.frombuffer(sequence, dtype=np.uint8)
+	else :
+		letters = np.asarray(sequence, dtype=np.uint8)
+	sequence_length = len(letters)
+	logging.info(f"Attempting to encode a sequence with 2-bit packed codes. Sequence length is {sequence_length}")
+
+	# lookup table : byte value -> 2-bit code, 4 for letters out of the alphabet
+	lookup_table = np.full(256, 4, dtype=np.uint8)
+	for code, alphabet in enumerate( ("Aa", "Cc", "Gg", "TtUu") ) :
+		lookup_table[ list(alphabet.encode("ascii")) ] = code
+
+	padded_length = -(-sequence_length // 32) * 32
+	codes = np.zeros( padded_length, dtype=np.uint8 )
+	codes[:sequence_length] = lookup_table[letters]
+	valid = ( codes < 4 ).view(np.uint8)
+	valid[sequence_length:] = 0
+	codes &= 3
+
+	packed_sequence = PackedSequence( _pack_2bit(codes), sequence_length, _pack_2bit(valid) )
+	logging.info(f"Sequence successfully encoded into {len(packed_sequence.words)} words, {sequence_length-int(valid.sum())} invalid letters masked")
+	return packed_sequence
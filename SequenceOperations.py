@@ -1,8 +1,12 @@
 
 import numpy as np
-from scipy.signal import fftconvolve, convolve
 import logging
 
+from SequenceEncoding import PackedSequence
+
+# SciPy is only imported by the convolution functions relying on it (convolve_sequence, convolve_sequence_fft),
+# so that the default pipeline (moving_average) does not pay for its import time
+
 ### SEQUENCE OPERATIONS ###
 
 def compute_sequence_identity(sequence_1, sequence_2) :
@@ -23,6 +27,9 @@ def compute_sequence_identity(sequence_1, sequence_2) :
 	But, the output of this function may not correspond to sequence identity computing while using a different sequence encoding protocol.
 	Thus, make sure you know what you're doing if you don't use one-hot sequence encoding.
 
+	Summation is performed over the last axis (letter vectors), so that stacks of sequences
+	( see SubSequenceGenerator.generate_shift_matrix ) are compared at once.
+
 	inputs :
 		- sequence_1 ( vector encoded sequences ) 
 		- sequence_2 ( vector encoded sequences ) 
@@ -31,10 +38,77 @@ def compute_sequence_identity(sequence_1, sequence_2) :
 		- sequence ( array )
 
 	"""
-	return np.sum( sequence_1 * sequence_2, axis=1 )
+	return np.sum( sequence_1 * sequence_2, axis=-1 )
+
+
+def compute_code_identity(sequence_1, sequence_2) :
+	"""
+	Given two integer encoded sequences ( see SequenceEncoding.integer_encoding ).
+	sequence identity is computed by direct comparison of letter codes.
+
+	illustration :
+		AAA X ABA
+			-> [0,0,0] == [0,1,0] -> [1,0,1] # positions 0 and 2 and identical, position 1 has missmatch
+
+	The output is equivalent to compute_sequence_identity applied on one-hot encoded sequences,
+	but no multiplication nor summation is performed and no float64 array is allocated.
+	Identity is returned as a uint8 array (a view of the boolean comparison, no copy) holding 0 or 1.
+
+	inputs :
+		- sequence_1 ( integer encoded sequences )
+		- sequence_2 ( integer encoded sequences )
+
+	returns :
+		- sequence ( array[uint8] )
+
+	"""
+	return np.equal( sequence_1, sequence_2 ).view(np.uint8)
+
+
+# _BYTE_BASE_COUNTS[byte, r] is the number of identical bases among the r first bases (2 bits each) of a byte of packed identity,
+# _BYTE_BASE_COUNTS[byte, 4] being the count over the whole byte
+_BYTE_BASE_COUNTS = np.array( [ [ bin( value & ((1 << 2*base) - 1) ).count("1") for base in range(5) ] for value in range(256) ], dtype=np.uint8 )
+
+
+def compute_packed_identity(sequence_1, sequence_2) :
+	"""
+	Given two 2-bit packed sequences ( see SequenceEncoding.packed_encoding ).
+	sequence identity is computed 32 bases at a time, on 64-bit words :
+
+		-> XOR of the words leaves 00 on the bits of identical bases
+		-> OR of the two bits of each base, then NOT, sets the lowest bit of each identical base
+		-> AND with the masks of both sequences clears bases out of the alphabet (N, IUPAC codes)
+
+	The output is the packed identity : a PackedSequence without mask, holding the lowest bit of each identical base.
+	The number of identical bases of any block of words is given by a popcount (bit count), which is what
+	moving_average_packed relies on. Stacks of packed sequences are compared at once, as arrays are.
+
+	inputs :
+		- sequence_1 ( PackedSequence )
+		- sequence_2 ( PackedSequence )
+
+	returns :
+		- identity ( PackedSequence )
+	"""
+	identity = np.bitwise_xor( sequence_1.words, sequence_2.words )
+	identity |= identity >> np.uint64(1)
+	np.invert( identity, out=identity )
+	identity &= sequence_1.mask
+	identity &= sequence_2.mask
+	return PackedSequence( identity, sequence_1.length )
 
 
-def convolve_sequence( sequence, kernel_size=120, convolution_mode="valid" ) :
+def _box_kernel( kernel_size, ndim, axis ) :
+	"""
+	build a rectangular kernel of 1/kernel_size values laid along axis
+	of an array with ndim dimensions (other dimensions have length 1)
+	"""
+	shape = [1] * ndim
+	shape[axis] = kernel_size
+	return np.full( shape, 1/kernel_size )
+
+
+def convolve_sequence( sequence, kernel_size=120, convolution_mode="valid", axis=-1 ) :
 	"""
 	Given an array repporting a single value measurement per position,
 	compute a convoluted version of this array using a mobile average strategy.
@@ -45,26 +119,276 @@ def convolve_sequence( sequence, kernel_size=120, convolution_mode="valid" ) :
 	However, unless you're using a crazy big window, this function run faster than fft acceleration
 	Benchmark shows better performances while kernel_size approximately under 200.
 	Above 200, consider using convolve_sequence_fft instead. But who on earth would use such big window ?
+	Since the kernel is rectangular, moving_average below computes the same result in O(n) whatever the kernel_size.
+
+	For 2D inputs (one row per shift), each row is convolved independently along axis,
+	in a single call. scipy.signal.convolve direct method is extremely slow on N-D arrays,
+	thus the 1D correlation routine from scipy.ndimage is used along axis in that case.
 	"""
-	kernel = np.ones(kernel_size)/kernel_size
-	convolved  = convolve( sequence, kernel, mode=convolution_mode, method="direct")
-	return convolved
+	from scipy.signal import convolve
+	from scipy.ndimage import correlate1d
+
+	if np.ndim(sequence) == 1 :
+		kernel = np.ones(kernel_size)/kernel_size
+		convolved  = convolve( sequence, kernel, mode=convolution_mode, method="direct")
+		return convolved
+
+	sequence = np.asarray( sequence )
+	if sequence.dtype.kind != "f" :
+		sequence = sequence.astype(np.float64)
+	sequence_length = sequence.shape[axis]
+
+	# correlate1d centers the kernel on kernel_size//2 and returns an array of input length.
+	# full and same modes are obtained by zero padding, then all modes are cropped from the centered output
+	if convolution_mode == "valid" :
+		first, length = 0, sequence_length - kernel_size + 1
+	elif convolution_mode == "full" :
+		first, length = 0, sequence_length + kernel_size - 1
+	elif convolution_mode == "same" :
+		first, length = (kernel_size-1)//2, sequence_length
+	else :
+		raise ValueError(f"unknown convolution_mode {convolution_mode}, expected valid, same or full")
+
+	if convolution_mode != "valid" :
+		padding = [ (0,0) ] * sequence.ndim
+		padding[axis] = ( kernel_size-1, kernel_size-1 )
+		sequence = np.pad( sequence, padding )
 
+	correlated = correlate1d( sequence, np.ones(kernel_size)/kernel_size, axis=axis, mode="constant" )
+	window = [ slice(None) ] * sequence.ndim
+	window[axis] = slice( kernel_size//2 + first, kernel_size//2 + first + length )
+	return correlated[ tuple(window) ]
 
-def convolve_sequence_fft( sequence, kernel_size=120, convolution_mode="valid" ) :
+
+def convolve_sequence_fft( sequence, kernel_size=120, convolution_mode="valid", axis=-1 ) :
 	"""
 	Similar to convolve_sequence above.
 	This function rely on the fft acceleration procedure. 
 	However, in the case of convolution procedure for the computation of a mobile average,
 	this method isn't garanteed to be faster than the direct method.
 	Benchmarks show faster results using fft for averaging on kernel_size above 200 which is already very big.
+
+	For 2D inputs (one row per shift), each row is convolved independently along axis,
+	in a single call. The fft is then only performed along axis.
 	"""
-	kernel = np.ones(kernel_size)/kernel_size
-	convolved  = convolve( sequence, kernel, mode=convolution_mode, method="fft")
+	from scipy.signal import fftconvolve, convolve
+
+	if np.ndim(sequence) == 1 :
+		kernel = np.ones(kernel_size)/kernel_size
+		convolved  = convolve( sequence, kernel, mode=convolution_mode, method="fft")
+		return convolved
+
+	kernel = _box_kernel( kernel_size, np.ndim(sequence), axis )
+	convolved  = fftconvolve( sequence, kernel, mode=convolution_mode, axes=axis )
 	return convolved
 
 
-def transform_with_hill_sigmoid( sequence, midpoint=0.5, steepness=10) :
+def _along_axis( ndim, axis, index ) :
+	"""
+	build an indexing tuple selecting index along axis and everything along other dimensions
+	"""
+	selection = [ slice(None) ] * ndim
+	selection[axis] = index
+	return tuple(selection)
+
+
+def _prefix_sum( sequence, axis ) :
+	"""
+	compute the prefix sum of sequence along axis, with a leading zero ( output[i] = sum(sequence[:i]) ).
+
+	Integer and boolean inputs (such as identity computed by compute_code_identity) are accumulated
+	with integers, which is exact whatever the sequence length. int32 is used when the sum can not
+	overflow, int64 otherwise. Floating inputs are accumulated with float64.
+	"""
+	sequence_length = sequence.shape[axis]
+	if sequence.dtype.kind in "bu" and sequence.dtype.itemsize == 1 and sequence_length * 255 < 2**31 :
+		accumulator = np.int32
+	elif sequence.dtype.kind in "biu" :
+		accumulator = np.int64
+	else :
+		accumulator = np.float64
+
+	shape = list(sequence.shape)
+	shape[axis] += 1
+	prefix = np.empty( shape, dtype=accumulator )
+	prefix[ _along_axis(sequence.ndim, axis, 0) ] = 0
+	np.cumsum( sequence, axis=axis, dtype=accumulator, out=prefix[ _along_axis(sequence.ndim, axis, slice(1,None)) ] )
+	return prefix
+
+
+def _window_means( prefix, kernel_size, convolution_mode, axis, dtype=np.float64, hop=1 ) :
+	"""
+	given a prefix sum ( see _prefix_sum ), compute the mean over each window of kernel_size positions, as dtype.
+	Output length follows scipy.signal.convolve modes : valid, same or full, only every hop-th window being kept.
+	In same and full modes, windows crossing sequence borders are zero padded.
+	"""
+	ndim = prefix.ndim
+	sequence_length = prefix.shape[axis] - 1
+
+	if convolution_mode == "valid" :
+		upper = slice( kernel_size, sequence_length+1, hop )
+		lower = slice( 0, max(sequence_length+1-kernel_size, 0), hop )
+		upper, lower = prefix[ _along_axis(ndim, axis, upper) ], prefix[ _along_axis(ndim, axis, lower) ]
+
+	elif convolution_mode in ("same", "full") :
+		# window ending at position t covers [ t-kernel_size+1 , t ], clipped to the sequence boundaries
+		if convolution_mode == "full" :
+			window_end = np.arange( sequence_length+kernel_size-1 )
+		else :
+			window_end = np.arange( sequence_length ) + (kernel_size-1)//2
+		window_end = window_end[::hop]
+		upper = np.take( prefix, np.clip(window_end+1, 0, sequence_length), axis=axis )
+		lower = np.take( prefix, np.clip(window_end-kernel_size+1, 0, sequence_length), axis=axis )
+
+	else :
+		raise ValueError(f"unknown convolution_mode {convolution_mode}, expected valid, same or full")
+
+	averaged = np.subtract( upper, lower, dtype=dtype )
+	averaged /= kernel_size
+	return averaged
+
+
+def moving_average( sequence, kernel_size=120, convolution_mode="valid", axis=-1, dtype=np.float64, hop=1 ) :
+	"""
+	Given an array repporting a single value measurement per position,
+	compute its mobile average over a gliding window of kernel_size positions.
+
+	The result is equivalent to convolve_sequence (convolution with a rectangular kernel) and supports
+	the same valid / same / full modes, but it relies on a prefix sum : the sum over a window is the
+	difference between two prefix sum values. The cost is O(n) whatever the kernel_size.
+
+	Identity arrays made of 0 and 1 (compute_code_identity) are accumulated with integers, thus
+	the result is exact, even for chromosome scale inputs. For floating inputs on very long sequences,
+	the rounding error of the prefix sum grows with the position, see moving_average_stable.
+
+	For 2D inputs (one row per shift), each row is averaged independently along axis, in a single call.
+
+	The output is allocated as dtype. With float32, the output takes half the memory and window sums
+	of integer inputs remain exact (below 2**24), only the final division is rounded to float32.
+
+	With hop > 1, only one window every hop positions is computed ( output[j] is the mean of window j*hop ).
+	Neighbouring windows of a wide kernel are almost identical, so the output, and every following stage,
+	is hop times smaller for the same picture.
+
+	inputs :
+		- sequence (array) : values to average
+		- kernel_size (int) : number of positions in the gliding window
+		- convolution_mode (str) : valid, same or full (see scipy.signal.convolve)
+		- axis (int) : axis along which the window glides
+		- dtype (dtype) : floating type of the output (default = float64)
+		- hop (int) : number of positions between computed windows (default = 1, every position)
+
+	returns :
+		- averaged (array[dtype])
+
+	raises :
+		- ValueError -> unknown convolution_mode
+	"""
+	sequence = np.asarray( sequence )
+	axis = axis % sequence.ndim
+	prefix = _prefix_sum( sequence, axis )
+	return _window_means( prefix, kernel_size, convolution_mode, axis, dtype, hop )
+
+
+def moving_average_packed( identity, kernel_size=120, convolution_mode="valid", dtype=np.float64, hop=1 ) :
+	"""
+	Counterpart of moving_average for packed identity ( see compute_packed_identity ).
+
+	The prefix sum is built from bit counts of the packed bytes (4 bases each) : the number of identical bases
+	before base 4*b+r is the bit count of all bytes before b plus the bit count of the r first bases of byte b,
+	both read from a 256 entries lookup table. Identity is never unpacked into a byte per base, and the result
+	is exactly the one of moving_average on the identity of compute_code_identity (as long as the sequence
+	has no masked letters, which never count as identical).
+
+	inputs :
+		- identity (PackedSequence) : packed identity, 1D or 2D (one row per shift)
+		- kernel_size (int) : number of positions in the gliding window
+		- convolution_mode (str) : valid, same or full (see scipy.signal.convolve)
+		- dtype (dtype) : floating type of the output (default = float64)
+		- hop (int) : number of positions between computed windows ( see moving_average )
+
+	returns :
+		- averaged (array[dtype])
+
+	raises :
+		- ValueError -> unknown convolution_mode
+	"""
+	packed_bytes = np.ascontiguousarray( identity.words, dtype="<u8" ).view( np.uint8 )
+	byte_count = packed_bytes.shape[-1]
+	byte_prefix = np.zeros( packed_bytes.shape[:-1] + (byte_count+1,), dtype=np.int32 )
+	np.cumsum( _BYTE_BASE_COUNTS[:, 4][packed_bytes], axis=-1, dtype=np.int32, out=byte_prefix[..., 1:] )
+
+	prefix = np.empty( packed_bytes.shape[:-1] + (byte_count*4+1,), dtype=np.int32 )
+	prefix[..., -1] = byte_prefix[..., -1]
+	# view of prefix[..., :-1] as (..., bytes, 4 bases)
+	within_bytes = np.lib.stride_tricks.as_strided(
+		prefix,
+		shape   = packed_bytes.shape + (4,),
+		strides = prefix.strides[:-1] + (4*prefix.itemsize, prefix.itemsize)
+	)
+	np.add( byte_prefix[..., :-1, None], _BYTE_BASE_COUNTS[:, :4][packed_bytes], out=within_bytes )
+	return _window_means( prefix[..., :identity.length+1], kernel_size, convolution_mode, packed_bytes.ndim-1, dtype, hop )
+
+
+def moving_average_stable( sequence, kernel_size=120, convolution_mode="valid", axis=-1, block_size=2**16, dtype=np.float64, hop=1 ) :
+	"""
+	Numerically stable version of moving_average for floating inputs on very long sequences.
+
+	The prefix sum is restarted every block_size output positions, so that the accumulated values
+	never exceed block_size+kernel_size terms and the rounding error does not grow with the sequence length.
+	The cost remains O(n) whatever the kernel_size. Integer inputs are exact and directly sent to moving_average.
+
+	inputs :
+		- sequence (array) : values to average
+		- kernel_size (int) : number of positions in the gliding window
+		- convolution_mode (str) : valid, same or full (see scipy.signal.convolve)
+		- axis (int) : axis along which the window glides
+		- block_size (int) : number of positions covered by a single prefix sum, rounded up to a multiple of hop
+		- dtype (dtype) : floating type of the output (default = float64)
+		- hop (int) : number of positions between computed windows ( see moving_average )
+
+	returns :
+		- averaged (array[dtype])
+
+	raises :
+		- ValueError -> unknown convolution_mode
+	"""
+	sequence = np.asarray( sequence )
+	if sequence.dtype.kind in "biu" :
+		return moving_average( sequence, kernel_size, convolution_mode, axis, dtype, hop )
+
+	ndim = sequence.ndim
+	axis = axis % ndim
+
+	# same and full modes are valid mode applied on a zero padded sequence
+	if convolution_mode == "valid" :
+		first, length = 0, sequence.shape[axis] - kernel_size + 1
+	elif convolution_mode == "full" :
+		first, length = 0, sequence.shape[axis] + kernel_size - 1
+	elif convolution_mode == "same" :
+		first, length = (kernel_size-1)//2, sequence.shape[axis]
+	else :
+		raise ValueError(f"unknown convolution_mode {convolution_mode}, expected valid, same or full")
+
+	if convolution_mode != "valid" :
+		padding = [ (0,0) ] * ndim
+		padding[axis] = ( kernel_size-1, kernel_size-1 )
+		sequence = np.pad( sequence, padding )
+
+	# blocks start on computed windows
+	block_size = -(-block_size // hop) * hop
+	shape = list(sequence.shape)
+	shape[axis] = -(-max(length, 0) // hop)
+	averaged = np.empty( shape, dtype=dtype )
+	for block_start in range( 0, length, block_size ) :
+		block_end = min( block_start+block_size, length )
+		block = sequence[ _along_axis(ndim, axis, slice(first+block_start, first+block_end+kernel_size-1)) ]
+		output_slice = slice( block_start//hop, -(-block_end//hop) )
+		averaged[ _along_axis(ndim, axis, output_slice) ] = _window_means( _prefix_sum(block, axis), kernel_size, "valid", axis, hop=hop )
+	return averaged
+
+
+def transform_with_hill_sigmoid( sequence, midpoint=0.5, steepness=10, in_place=False) :
 	"""
 	apply a sigmoidal filter onto an array of floats
 
@@ -100,6 +424,246 @@ def transform_with_hill_sigmoid( sequence, midpoint=0.5, steepness=10) :
 	0.8 |   0.82  0.95  0.99  1.00  1.00  1.00  1.00  1.00
 	0.9 |   0.88  0.98  1.00  1.00  1.00  1.00  1.00  1.00
 
+	With in_place=True, the sigmoid is computed into the input floating array, step by step, without any
+	temporary array. The input is overwritten and returned, keeping its dtype (float32 stays float32).
+	The engine protocol allows it since the convolved array is never reused once scored.
+
+	"""
+	if not in_place :
+		return 1 / ( 1 + np.exp(-steepness * (sequence-midpoint)) )
+
+	np.subtract( sequence, midpoint, out=sequence )
+	np.multiply( sequence, -steepness, out=sequence )
+	np.exp( sequence, out=sequence )
+	np.add( sequence, 1, out=sequence )
+	np.reciprocal( sequence, out=sequence )
+	return sequence
+
+
+### QUANTIZED SCORES ###
+#
+# scores lay in [0,1] and can be stored as uint8 codes, 8 times smaller than float64 :
+#     code  = round( score * QUANTIZATION_SCALE )
+#     score = code / QUANTIZATION_SCALE
+# the absolute error is at most 1 / (2*QUANTIZATION_SCALE) ~ 0.002. Missing values (NaN) are stored as QUANTIZED_MISSING.
+
+QUANTIZATION_SCALE = 254
+QUANTIZED_MISSING = 255
+
+
+def quantize_scores( scores, out=None ) :
+	"""
+	convert scores in [0,1] into uint8 codes ( see QUANTIZATION_SCALE ), values outside [0,1] are clipped
+
+	inputs :
+		- scores (array[float])
+		- out (array[uint8]) : optional output array of the same shape
+
+	returns :
+		- codes (array[uint8])
+	"""
+	scores = np.asarray( scores )
+	if out is None :
+		out = np.empty( scores.shape, dtype=np.uint8 )
+	scaled = np.multiply( scores, QUANTIZATION_SCALE, dtype=np.float32 )
+	np.rint( scaled, out=scaled )
+	np.clip( scaled, 0, QUANTIZATION_SCALE, out=scaled )
+	missing = np.isnan( scaled )
+	scaled[missing] = QUANTIZED_MISSING
+	np.copyto( out, scaled, casting="unsafe" )
+	return out
+
+
+def dequantize_scores( codes ) :
+	"""
+	convert uint8 codes back to float32 scores, QUANTIZED_MISSING codes to NaN
+	"""
+	scores = np.divide( codes, QUANTIZATION_SCALE, dtype=np.float32 )
+	scores[ codes == QUANTIZED_MISSING ] = np.nan
+	return scores
+
+
+
+### PERIOD SPECTRUM ###
+#
+# identity for all shifts at once : the number of identical letters between a sequence and its version shifted
+# by s is the sum, over letters, of the autocorrelation of the letter indicator (one-hot channel) at lag s.
+# Autocorrelations are computed with FFT, in O(n log n) whatever the number of shifts, instead of O(n x shifts)
+# for shift matrices. Inputs are integer encoded sequences ( see SequenceEncoding.integer_encoding ).
+
+def _fft_length( length ) :
+	"""
+	smallest power of 2 above length, FFT sizes must not wrap correlations around
+	"""
+	return 1 << max( int(length)-1, 0 ).bit_length()
+
+
+def period_spectrum( sequence, min_shift, max_shift ) :
 	"""
-	return 1 / ( 1 + np.exp(-steepness * (sequence-midpoint)) )
+	Global identity of a sequence with its shifted versions, for shifts from min_shift to max_shift excluded.
 
+	identity[s] = number of positions i where sequence[i] == sequence[i+s], divided by len(sequence)-s
+
+	inputs :
+		- sequence (array[uint8]) : integer encoded sequence
+		- min_shift, max_shift (int) : shift range, max_shift excluded
+
+	returns :
+		- identity (array[float64]) : one value per shift
+	"""
+	sequence = np.asarray( sequence )
+	sequence_length = len(sequence)
+	fft_length = _fft_length( sequence_length + max_shift )
+	spectrum = np.zeros( fft_length//2+1, dtype=np.complex128 )
+	for letter in range( int(sequence.max(initial=0))+1 ) :
+		transformed = np.fft.rfft( sequence == letter, fft_length )
+		spectrum += transformed.real**2 + transformed.imag**2
+	counts = np.rint( np.fft.irfft(spectrum, fft_length)[ min_shift:max_shift ] )
+	return counts / np.maximum( sequence_length - np.arange(min_shift, max_shift), 1 )
+
+
+def windowed_period_spectrum( sequence, min_shift, max_shift, window_size=120, hop=None, batch_size=None ) :
+	"""
+	Short-time counterpart of period_spectrum : identity for all shifts over windows of window_size letters.
+
+	Column j reports, for each shift s, the fraction of identical letters between sequence[t:t+window_size]
+	and sequence[t+s:t+s+window_size], with t = j*hop. This is exactly the value of column t computed by the
+	shift matrix protocol ( generate_shift_matrix, compute_code_identity, moving_average with kernel_size=window_size ),
+	thus the positional resolution is the one of the convolution kernel, while the cost per window is
+	O( (window_size+max_shift) log(window_size+max_shift) ) instead of O( window_size x shifts ).
+
+	Windows are transformed by batches of batch_size (default : about 4 million FFT values per batch).
+
+	inputs :
+		- sequence (array[uint8]) : integer encoded sequence
+		- min_shift, max_shift (int) : shift range, max_shift excluded
+		- window_size (int) : number of letters per window, such as the convolution kernel_size
+		- hop (int) : number of letters between consecutive windows (default = window_size)
+
+	returns :
+		- identity (array[float64]) : 2D array, one row per shift, one column per window
+	"""
+	sequence = np.asarray( sequence )
+	if hop is None :
+		hop = window_size
+	span = window_size + max_shift - 1
+	window_count = max( (len(sequence) - max_shift - window_size) // hop + 1, 0 )
+	fft_length = _fft_length( span )
+	if batch_size is None :
+		batch_size = max( 2**22 // fft_length, 1 )
+
+	# windows of span letters, compared with their first window_size letters
+	windows = np.lib.stride_tricks.as_strided(
+		sequence,
+		shape   = (window_count, span),
+		strides = (hop*sequence.strides[0], sequence.strides[0]),
+		writeable = False
+	)
+	letter_count = int(sequence.max(initial=0)) + 1
+	output = np.empty( (max_shift-min_shift, window_count), dtype=np.float64 )
+	for batch_start in range( 0, window_count, batch_size ) :
+		batch = windows[ batch_start:batch_start+batch_size ]
+		spectrum = np.zeros( (len(batch), fft_length//2+1), dtype=np.complex128 )
+		for letter in range( letter_count ) :
+			indicator = batch == letter
+			transformed = np.fft.rfft( indicator, fft_length, axis=1 )
+			spectrum += np.conj( np.fft.rfft(indicator[:, :window_size], fft_length, axis=1) ) * transformed
+		counts = np.fft.irfft( spectrum, fft_length, axis=1 )[ :, min_shift:max_shift ]
+		output[ :, batch_start:batch_start+len(batch) ] = np.rint( counts ).T
+	output /= window_size
+	logging.info(f"period spectrum of {max_shift-min_shift} shifts over {window_count} windows of {window_size} letters")
+	return output
+
+
+
+### K-MER SPACING SCREEN ###
+#
+# cheap pre-screen of the (window, shift) cells worth computing : a repeat of period s makes identical k-mers
+# occur s letters apart. Positions are sorted by k-mer hash, so that identical k-mers are neighbours, and the
+# distances between occurrences closer than max_shift are counted per window of positions. The cost is one sort
+# plus the number of close pairs, instead of O(n x shifts). Letters are hashed by byte value, whatever the encoding.
+
+def _letters( sequence ) :
+	if isinstance(sequence, str) :
+		sequence = sequence.encode("ascii")
+	if isinstance(sequence, (bytes, bytearray, memoryview)) :
+		return np.frombuffer( sequence, dtype=np.uint8 )
+	return np.asarray( sequence, dtype=np.uint8 )
+
+
+def kmer_spacing_counts( sequence, min_shift, max_shift, window_size, k=5, block_size=2**22 ) :
+	"""
+	Histogram, per window of positions, of the distances between identical k-mers.
+
+	counts[w, s-min_shift] = number of positions i in window w ( i // window_size == w ) where the k-mers
+	starting at i and i+s are identical, for shifts from min_shift to max_shift excluded.
+	k-mers are hashed on 64 bits : above 7 letters, hash collisions may add a few pairs, never remove one.
+	Positions are processed by blocks of block_size (rounded to whole windows), bounding memory on chromosome scale sequences.
+
+	inputs :
+		- sequence (str, bytes or array[uint8]) : letters of the sequence
+		- min_shift, max_shift (int) : shift range, max_shift excluded
+		- window_size (int) : number of positions per window
+		- k (int) : k-mer length (default = 5)
+
+	returns :
+		- counts (array[int64]) : 2D array, one row per window, one column per shift
+	"""
+	letters = _letters( sequence )
+	kmer_count = max( len(letters) - k + 1, 0 )
+	shift_count = max_shift - min_shift
+	window_count = -(-kmer_count // window_size)
+	counts = np.zeros( window_count * shift_count, dtype=np.int64 )
+	block_size = max( block_size // window_size, 1 ) * window_size
+
+	for block_start in range( 0, kmer_count, block_size ) :
+		# k-mers starting in the block, followed by the max_shift-1 k-mers they can be paired with
+		block_end = min( block_start + block_size + max_shift - 1, kmer_count )
+		hashes = letters[ block_start:block_end ].astype( np.uint64 )
+		for offset in range( 1, k ) :
+			hashes = hashes * np.uint64(256) + letters[ block_start+offset : block_end+offset ]
+		order = np.argsort( hashes, kind="stable" )
+		hashes = hashes[order]
+
+		# pair each occurrence with the next ones of the same k-mer, as long as they are less than max_shift apart
+		first = np.flatnonzero( order < block_size )
+		gap = 1
+		while len(first) > 0 :
+			first = first[ first + gap < len(order) ]
+			first = first[ hashes[first+gap] == hashes[first] ]
+			distances = order[first+gap] - order[first]
+			first, distances = first[ distances < max_shift ], distances[ distances < max_shift ]
+			kept = distances >= min_shift
+			windows = ( order[first[kept]] + block_start ) // window_size
+			counts += np.bincount( windows * shift_count + distances[kept] - min_shift, minlength=len(counts) )
+			gap += 1
+
+	return counts.reshape( window_count, shift_count )
+
+
+def kmer_spacing_screen( sequence, min_shift, max_shift, window_size, k=5, fold=4.0, min_count=4 ) :
+	"""
+	Select the (window, shift) cells where identical k-mers are found more often than expected at random.
+
+	Without repeat, two positions hold the same k-mer with probability p**k, p being the probability that two
+	letters are identical given the letter frequencies of the sequence. A cell is a candidate when its count
+	( see kmer_spacing_counts ) reaches fold times this background, and at least min_count.
+
+	inputs :
+		- sequence (str, bytes or array[uint8]) : letters of the sequence
+		- min_shift, max_shift (int) : shift range, max_shift excluded
+		- window_size (int) : number of positions per window
+		- k (int) : k-mer length (default = 5)
+		- fold (float) : minimal enrichment over background (default = 4)
+		- min_count (int) : minimal number of identical k-mer pairs (default = 4)
+
+	returns :
+		- candidates (array[bool]) : 2D array, one row per window, one column per shift
+	"""
+	letters = _letters( sequence )
+	counts = kmer_spacing_counts( letters, min_shift, max_shift, window_size, k )
+	frequencies = np.bincount( letters, minlength=256 ) / max( len(letters), 1 )
+	background = window_size * np.sum( frequencies**2 )**k
+	candidates = counts >= max( fold * background, min_count )
+	logging.info(f"k-mer spacing screen kept {candidates.sum()} of {candidates.size} window x shift cells")
+	return candidates
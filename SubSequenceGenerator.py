@@ -1,3 +1,6 @@
+import numpy as np
+
+from SequenceEncoding import PackedSequence
 
 
 def generate_shifted_sequences( sequence, min_shift, max_shift ) :
@@ -47,4 +50,148 @@ def generate_shifted_sequences_varLen( sequence, min_shift, max_shift ) :
 		sequence_shifted = sequence[shift:]
 		sequence_shifted = sequence_shifted[:max_sequence_length]
 		sequence_cropped = sequence[:max_sequence_length]
-		yield sequence_shifted, sequence_cropped
\ No newline at end of file
+		yield sequence_shifted, sequence_cropped
+
+
+def generate_shift_matrix( sequence, min_shift, max_shift ) :
+	"""
+	vectorized counterpart of generate_shifted_sequences.
+	instead of yielding one pair of sequences per shift, all shifted versions of the input sequence
+	are returned at once as rows of a matrix, alongside the cropped version of the input sequence.
+
+	no copy is performed : the shifted matrix is a strided view of the input sequence where
+	row i starts at position min_shift+i. The cropped sequence is returned with a leading axis
+	of length 1 so that it broadcasts against every row of the shifted matrix.
+	Rows have the same length as sequences yielded by generate_shifted_sequences.
+
+	** Warning : both outputs are read-only views of the input sequence. Do not write into them.
+
+	inputs :
+		- sequence (array) : input sequence used as template for shifted version generation
+		- min_shift (int)  : minimal shift value to start generation with
+		- max_shift (int)  : maximal shift value to end generation with
+
+	returns :
+		- sequence_shifted : array of shape (max_shift-min_shift, len(sequence)-max_shift, ...)
+		- sequence_cropped : array of shape (1, len(sequence)-max_shift, ...)
+
+	"""
+	sequence = np.asarray(sequence)
+	max_sequence_length = max( len(sequence) - max_shift, 0 )
+	shift_count = max_shift - min_shift
+
+	sequence_shifted = np.lib.stride_tricks.as_strided(
+		sequence[min_shift:],
+		shape   = (shift_count, max_sequence_length) + sequence.shape[1:],
+		strides = (sequence.strides[0],) + sequence.strides,
+		writeable = False
+	)
+	sequence_cropped = sequence[np.newaxis, :max_sequence_length]
+	return sequence_shifted, sequence_cropped
+
+
+
+def generate_aligned_shift_matrix( sequence, min_shift, max_shift ) :
+	"""
+	shift-independent counterpart of generate_shift_matrix.
+	every row has the length of the input sequence, so that column j always corresponds to position j
+	of the sequence whatever the shift range. As with generate_shifted_sequences_varLen, the row of shift s
+	holds len(sequence)-s meaningful positions. The sequence is padded with max_shift zero letters
+	to fill the row tails : those positions must be discarded after comparison.
+
+	a copy of the sequence is performed (padding), rows are then strided views of that copy.
+
+	inputs :
+		- sequence (array) : input sequence used as template for shifted version generation
+		- min_shift (int)  : minimal shift value to start generation with
+		- max_shift (int)  : maximal shift value to end generation with
+
+	returns :
+		- sequence_shifted : array of shape (max_shift-min_shift, len(sequence), ...)
+		- sequence_cropped : array of shape (1, len(sequence), ...), the input sequence itself
+
+	"""
+	sequence = np.asarray(sequence)
+	padding = np.zeros( (max_shift,) + sequence.shape[1:], dtype=sequence.dtype )
+	return generate_shift_matrix( np.concatenate([sequence, padding]), min_shift, max_shift )
+
+
+def _packed_shift_rows( words, shifts, word_count ) :
+	"""
+	gather, for each shift s, the word_count words of packed bases starting at base s.
+	words must hold at least one word after the last gathered one (see _pad_packed)
+	"""
+	word_shifts, base_shifts = np.divmod( np.asarray(shifts, dtype=np.intp), 32 )
+	index = word_shifts[:,None] + np.arange( word_count )
+	bit_shifts = ( 2*base_shifts ).astype(np.uint64)[:,None]
+	rows = words[index] >> bit_shifts
+	# bases coming from the next word, shifted in two steps so that a null bit shift gives 0 and not an undefined 64 bits shift
+	rows |= ( words[index+1] << (np.uint64(63)-bit_shifts) ) << np.uint64(1)
+	return rows
+
+
+def _pad_packed( packed_sequence ) :
+	return (
+		np.append( packed_sequence.words, np.uint64(0) ),
+		np.append( packed_sequence.mask, np.uint64(0) ),
+	)
+
+
+def _cropped_packed( packed_sequence, sequence_length ) :
+	"""
+	first sequence_length bases of a packed sequence, mask bits of the following bases cleared
+	"""
+	word_count = -(-sequence_length // 32)
+	mask = packed_sequence.mask[:word_count].copy()
+	if sequence_length % 32 :
+		mask[-1] &= np.uint64( (1 << 2*(sequence_length%32)) - 1 )
+	return packed_sequence.words[:word_count], mask
+
+
+def generate_packed_shift_matrix( sequence, min_shift, max_shift ) :
+	"""
+	Counterpart of generate_shift_matrix for 2-bit packed sequences ( see SequenceEncoding.packed_encoding ).
+
+	Shifting a packed sequence by s bases moves its words by s//32 and its bits by 2*(s%32) :
+	each row of the shifted matrix is gathered and bit-shifted from the original words.
+	Rows hold the len(sequence)-max_shift first bases of each shifted sequence, as with generate_shift_matrix.
+
+	inputs :
+		- sequence (PackedSequence) : 1D packed sequence
+		- min_shift (int)  : minimal shift value
+		- max_shift (int)  : maximal shift value (excluded)
+
+	returns :
+		- sequence_shifted (PackedSequence) : 2D, one row per shift
+		- sequence_cropped (PackedSequence) : 2D with a single row, broadcastable against sequence_shifted rows
+	"""
+	cropped_length = max( sequence.length - max_shift, 0 )
+	cropped_words, cropped_mask = _cropped_packed( sequence, cropped_length )
+	words, mask = _pad_packed( sequence )
+	shifts = range( min_shift, max_shift )
+	sequence_shifted = PackedSequence(
+		_packed_shift_rows( words, shifts, len(cropped_words) ),
+		cropped_length,
+		_packed_shift_rows( mask, shifts, len(cropped_words) )
+	)
+	sequence_cropped = PackedSequence( cropped_words[None], cropped_length, cropped_mask[None] )
+	return sequence_shifted, sequence_cropped
+
+
+def generate_packed_shifted_sequences( sequence, min_shift, max_shift ) :
+	"""
+	Counterpart of generate_shifted_sequences for 2-bit packed sequences, one shift at a time.
+	yields 1D PackedSequence pairs ( see generate_packed_shift_matrix ).
+	"""
+	cropped_length = max( sequence.length - max_shift, 0 )
+	cropped_words, cropped_mask = _cropped_packed( sequence, cropped_length )
+	sequence_cropped = PackedSequence( cropped_words, cropped_length, cropped_mask )
+	words, mask = _pad_packed( sequence )
+
+	for shift in range( min_shift, max_shift ) :
+		sequence_shifted = PackedSequence(
+			_packed_shift_rows( words, [shift], len(cropped_words) )[0],
+			cropped_length,
+			_packed_shift_rows( mask, [shift], len(cropped_words) )[0]
+		)
+		yield sequence_shifted, sequence_cropped
@@ -0,0 +1,338 @@
+
+## Common
+import sys
+from functools import partial
+from time import perf_counter
+import numpy as np
+import argparse
+import platform
+import tracemalloc
+import logging
+import json
+
+## CustomLib ##
+from SequenceEncoding import one_hot_encoding, integer_encoding, packed_encoding
+from SequenceOperations import compute_sequence_identity, compute_code_identity
+from SequenceOperations import convolve_sequence, convolve_sequence_fft, moving_average, moving_average_stable
+from SequenceOperations import transform_with_hill_sigmoid, quantize_scores
+from SequenceOperations import windowed_period_spectrum, kmer_spacing_screen
+from SequenceOperations import compute_packed_identity, moving_average_packed
+from SubSequenceGenerator import generate_shifted_sequences, generate_shifted_sequences_varLen
+from SubSequenceGenerator import generate_shift_matrix, generate_aligned_shift_matrix
+from SubSequenceGenerator import generate_packed_shifted_sequences, generate_packed_shift_matrix
+
+## CORE ##
+from AbstractAutoCorrelationEngine import AutoCorrelationEngine
+
+
+ALPHABETS = {
+	"dna"     : "ACGT",
+	"protein" : "ACDEFGHIKLMNPQRSTVWY",
+}
+
+
+def synthetic_sequence( alphabet, length, seed=0 ) :
+	"""
+	draw a random sequence of length letters from alphabet (uniform, reproducible with seed)
+	"""
+	letters = np.frombuffer( alphabet.encode("ascii"), dtype=np.uint8 )
+	return np.random.default_rng( seed ).choice( letters, length ).tobytes().decode("ascii")
+
+
+def consume( generator ) :
+	for pair in generator :
+		pass
+
+
+### BENCHMARK CASES ###
+#
+# each case takes the benchmark settings and a synthetic sequence, prepares its inputs (not measured)
+# and returns the function to measure. Cases have a maximal sequence length above which they are skipped
+# by default, either because they are quadratic in memory (one-hot, shift matrices) or because they are too slow.
+
+def case_encoding( encoding_F, settings, sequence ) :
+	return partial( encoding_F, sequence )
+
+def case_comparison( encoding_F, comparison_F, settings, sequence ) :
+	encoded = encoding_F( sequence )
+	return partial( comparison_F, encoded[settings.shift:], encoded[:-settings.shift] )
+
+def case_packed_comparison( settings, sequence ) :
+	shifted, cropped = generate_packed_shift_matrix( packed_encoding(sequence), settings.shift, settings.shift+1 )
+	return partial( compute_packed_identity, shifted[0], cropped[0] )
+
+def case_packed_convolution( settings, sequence ) :
+	shifted, cropped = generate_packed_shift_matrix( packed_encoding(sequence), settings.shift, settings.shift+1 )
+	return partial( moving_average_packed, compute_packed_identity(shifted[0], cropped[0]), kernel_size=settings.kernel_size )
+
+def case_convolution( convolution_F, settings, sequence ) :
+	encoded = integer_encoding( sequence )
+	identity = compute_code_identity( encoded[settings.shift:], encoded[:-settings.shift] )
+	return partial( convolution_F, identity, kernel_size=settings.kernel_size, convolution_mode="valid" )
+
+def case_scoring( scoring_F, settings, sequence ) :
+	encoded = integer_encoding( sequence )
+	identity = compute_code_identity( encoded[settings.shift:], encoded[:-settings.shift] )
+	convolved = moving_average( identity, kernel_size=settings.kernel_size )
+	return partial( scoring_F, convolved, midpoint=0.5, steepness=20 )
+
+def case_generator( generator_F, settings, sequence ) :
+	encoded = integer_encoding( sequence )
+	return lambda : consume( generator_F(encoded, min_shift=1, max_shift=settings.shifts+1) )
+
+def case_shift_matrix( shift_matrix_F, settings, sequence ) :
+	encoded = integer_encoding( sequence )
+	return partial( shift_matrix_F, encoded, min_shift=1, max_shift=settings.shifts+1 )
+
+def case_spectrum( settings, sequence ) :
+	encoded = integer_encoding( sequence )
+	return partial( windowed_period_spectrum, encoded, min_shift=1, max_shift=settings.shifts+1, window_size=settings.kernel_size )
+
+def case_screen( settings, sequence ) :
+	return partial( kmer_spacing_screen, sequence, min_shift=1, max_shift=settings.shifts+1, window_size=1000 )
+
+def case_engine( method, encoding_F, comparison_F, convolution_F, settings, sequence, generator_F=generate_shifted_sequences, shift_matrix_F=generate_shift_matrix ) :
+	auto_corr_worker = AutoCorrelationEngine(
+		encoding_F    = encoding_F,
+		comparison_F  = comparison_F,
+		convolution_F = partial(convolution_F, kernel_size=settings.kernel_size, convolution_mode="valid"),
+		scoring_F     = partial(transform_with_hill_sigmoid, midpoint=0.5, steepness=20 ),
+		generator_F   = partial(generator_F, min_shift=1, max_shift=settings.shifts+1),
+		shift_matrix_F = partial(shift_matrix_F, min_shift=1, max_shift=settings.shifts+1),
+		threads       = settings.threads
+	)
+	return partial( getattr(auto_corr_worker, method), sequence )
+
+
+CASES = [
+	# (stage, name, case, maximal length)
+	( "encoding",   "one_hot_encoding",           partial(case_encoding, one_hot_encoding),                                      10**6 ),
+	( "encoding",   "integer_encoding",           partial(case_encoding, integer_encoding),                                      None  ),
+	( "encoding",   "packed_encoding",            partial(case_encoding, packed_encoding),                                       None  ),
+	( "comparison", "compute_sequence_identity",  partial(case_comparison, one_hot_encoding, compute_sequence_identity),         10**6 ),
+	( "comparison", "compute_code_identity",      partial(case_comparison, integer_encoding, compute_code_identity),             None  ),
+	( "comparison", "compute_packed_identity",    case_packed_comparison,                                                        None  ),
+	( "convolution", "convolve_sequence",         partial(case_convolution, convolve_sequence),                                  None  ),
+	( "convolution", "convolve_sequence_fft",     partial(case_convolution, convolve_sequence_fft),                              None  ),
+	( "convolution", "moving_average",            partial(case_convolution, moving_average),                                     None  ),
+	( "convolution", "moving_average_stable",     partial(case_convolution, moving_average_stable),                              None  ),
+	( "convolution", "moving_average[float32]",   partial(case_convolution, partial(moving_average, dtype=np.float32)),          None  ),
+	( "convolution", "moving_average_packed",     case_packed_convolution,                                                       None  ),
+	( "scoring",    "transform_with_hill_sigmoid", partial(case_scoring, transform_with_hill_sigmoid),                           None  ),
+	( "scoring",    "transform_with_hill_sigmoid[in_place]", partial(case_scoring, partial(transform_with_hill_sigmoid, in_place=True)), None  ),
+	( "scoring",    "quantize_scores",            partial(case_scoring, lambda convolved, midpoint, steepness : quantize_scores(convolved)), None  ),
+	( "generator",  "generate_shifted_sequences", partial(case_generator, generate_shifted_sequences),                           None  ),
+	( "generator",  "generate_shifted_sequences_varLen", partial(case_generator, generate_shifted_sequences_varLen),             None  ),
+	( "generator",  "generate_shift_matrix",      partial(case_shift_matrix, generate_shift_matrix),                             None  ),
+	( "generator",  "generate_aligned_shift_matrix", partial(case_shift_matrix, generate_aligned_shift_matrix),                  None  ),
+	( "spectrum",   "windowed_period_spectrum",   case_spectrum,                                                                 None  ),
+	( "screening",  "kmer_spacing_screen",        case_screen,                                                                   None  ),
+	( "engine",     "process[one_hot,convolve_sequence]", partial(case_engine, "process", one_hot_encoding, compute_sequence_identity, convolve_sequence), 10**5 ),
+	( "engine",     "process[integer,moving_average]",    partial(case_engine, "process", integer_encoding, compute_code_identity, moving_average),       10**6 ),
+	( "engine",     "process_vectorized[integer,moving_average]", partial(case_engine, "process_vectorized", integer_encoding, compute_code_identity, moving_average), 10**6 ),
+	( "engine",     "process_vectorized[packed,moving_average_packed]", partial(case_engine, "process_vectorized", packed_encoding, compute_packed_identity, moving_average_packed,
+		generator_F=generate_packed_shifted_sequences, shift_matrix_F=generate_packed_shift_matrix), 10**6 ),
+]
+
+
+### MEASURES ###
+
+def measure_time( function, repeats ) :
+	"""
+	best wall time over repeats calls, in seconds.
+	an untimed call comes first, so that lazy imports ( SciPy ) and first-touch allocations are not timed
+	"""
+	function()
+	timings = list()
+	for repeat in range(repeats) :
+		start = perf_counter()
+		function()
+		timings.append( perf_counter()-start )
+	return min(timings)
+
+
+def measure_peak_memory( function ) :
+	"""
+	peak memory allocated during a call, in bytes (NumPy reports its allocations to tracemalloc).
+	measured on a separate call since tracing slows down execution
+	"""
+	tracemalloc.start()
+	try :
+		function()
+		current, peak = tracemalloc.get_traced_memory()
+	finally :
+		tracemalloc.stop()
+	return peak
+
+
+def run_benchmarks( settings ) :
+	results = list()
+	for alphabet_name in settings.alphabets :
+		for length in settings.sizes :
+			sequence = synthetic_sequence( ALPHABETS[alphabet_name], length, settings.seed )
+			for stage, name, case, max_length in CASES :
+				if settings.stages and stage not in settings.stages :
+					continue
+				if max_length is not None and length > max_length and not settings.no_limits :
+					logging.info(f"skipping {name} on {alphabet_name} sequence of length {length} (above {max_length})")
+					continue
+
+				function = case( settings, sequence )
+				seconds = measure_time( function, settings.repeats )
+				peak_bytes = measure_peak_memory( function )
+				logging.info(f"{stage:<12} {name:<45} {alphabet_name:<8} {length:>10} {seconds:>12.6f} s {peak_bytes/2**20:>10.2f} MB")
+				results.append( dict(
+					stage = stage,
+					case = name,
+					alphabet = alphabet_name,
+					length = length,
+					seconds = seconds,
+					peak_bytes = peak_bytes,
+				) )
+	return results
+
+
+def compare_to_baseline( results, baseline, tolerance ) :
+	"""
+	flag cases that are slower or use more memory than in baseline, by more than tolerance (relative)
+
+	returns :
+		- regressions (list[dict]) : results with their baseline values and ratios
+	"""
+	reference = { (entry["case"], entry["alphabet"], entry["length"]) : entry for entry in baseline["results"] }
+	regressions = list()
+	for entry in results :
+		previous = reference.get( (entry["case"], entry["alphabet"], entry["length"]) )
+		if previous is None :
+			continue
+		time_ratio = entry["seconds"] / max( previous["seconds"], 1e-9 )
+		memory_ratio = entry["peak_bytes"] / max( previous["peak_bytes"], 1 )
+		if time_ratio > 1+tolerance or memory_ratio > 1+tolerance :
+			regressions.append( dict(entry, baseline_seconds=previous["seconds"], baseline_peak_bytes=previous["peak_bytes"], time_ratio=time_ratio, memory_ratio=memory_ratio) )
+			logging.warning(f"regression on {entry['case']} {entry['alphabet']} {entry['length']} : time x{time_ratio:.2f}, memory x{memory_ratio:.2f}")
+	return regressions
+
+
+def parse_commandline_arguments() :
+	parser = argparse.ArgumentParser( description="benchmark each pipeline stage and function variant on synthetic sequences" )
+	parser.add_argument(
+		"-o","--output",
+		default="benchmark.json",
+		type=str,
+		help="path to JSON results (default=benchmark.json)"
+	)
+	parser.add_argument(
+		"-b","--baseline",
+		default=None,
+		type=str,
+		help="JSON results of a previous run to compare with, exit status is 1 on regression"
+	)
+	parser.add_argument(
+		"-tol","--tolerance",
+		default=0.25,
+		type=float,
+		help="relative time or memory increase above which a case is flagged as regression (default=0.25)"
+	)
+	parser.add_argument(
+		"-s","--sizes",
+		nargs="+",
+		default=[10**3, 10**4, 10**5, 10**6, 10**7],
+		type=lambda value : int(float(value)),
+		help="sequence lengths to benchmark (default=1e3 1e4 1e5 1e6 1e7)"
+	)
+	parser.add_argument(
+		"-a","--alphabets",
+		nargs="+",
+		default=list(ALPHABETS),
+		choices=list(ALPHABETS),
+		help="sequence alphabets to benchmark (default=dna protein)"
+	)
+	parser.add_argument(
+		"-st","--stages",
+		nargs="+",
+		default=None,
+		choices=["encoding", "comparison", "convolution", "scoring", "generator", "spectrum", "screening", "engine"],
+		help="only benchmark those stages (default=all)"
+	)
+	parser.add_argument(
+		"-k","--kernel_size",
+		default=120,
+		type=int,
+		help="convolution kernel size (default=120)"
+	)
+	parser.add_argument(
+		"-sh","--shift",
+		default=7,
+		type=int,
+		help="shift used by single pair comparison, convolution and scoring cases (default=7)"
+	)
+	parser.add_argument(
+		"-n","--shifts",
+		default=40,
+		type=int,
+		help="number of shifts for generator and engine cases (default=40)"
+	)
+	parser.add_argument(
+		"-t","--threads",
+		default=1,
+		type=int,
+		help="engine threads for engine cases (default=1)"
+	)
+	parser.add_argument(
+		"-r","--repeats",
+		default=3,
+		type=int,
+		help="number of timed calls per case, the best one is kept (default=3)"
+	)
+	parser.add_argument(
+		"--seed",
+		default=0,
+		type=int,
+		help="random seed of synthetic sequences (default=0)"
+	)
+	parser.add_argument(
+		"--no_limits",
+		action="store_true",
+		help="also run cases above their maximal sequence length (one-hot and engine cases need a lot of memory)"
+	)
+	return parser.parse_args()
+
+
+if __name__ == "__main__" :
+
+	logging.basicConfig(
+		level=logging.INFO,
+		format="%(asctime)s - %(filename)s - %(levelname)s - %(message)s",
+		handlers=[
+			logging.StreamHandler(sys.stdout)
+		]
+	)
+	# stage functions log at info level on every call, keep the benchmark report readable
+	for module in ("SequenceEncoding", "SequenceOperations", "AbstractAutoCorrelationEngine") :
+		logging.getLogger().addFilter( lambda record, module=module : record.module != module )
+
+	settings = parse_commandline_arguments()
+
+	import scipy
+	report = dict(
+		metadata = dict(
+			python = platform.python_version(),
+			numpy = np.__version__,
+			scipy = scipy.__version__,
+			machine = platform.machine(),
+			processor = platform.processor(),
+			settings = vars(settings),
+		),
+		results = run_benchmarks( settings ),
+	)
+	with open( settings.output, "w" ) as handle :
+		json.dump( report, handle, indent=1 )
+	logging.info(f"benchmark results written to {settings.output}")
+
+	if settings.baseline is not None :
+		with open( settings.baseline ) as handle :
+			baseline = json.load( handle )
+		regressions = compare_to_baseline( report["results"], baseline, settings.tolerance )
+		logging.info(f"{len(regressions)} regressions against {settings.baseline}")
+		if regressions :
+			sys.exit(1)
@@ -7,37 +7,59 @@ import argparse
 import logging
 
 ## CustomLib ##
-from seq_io import yield_sequences
+from seq_io import yield_sequences, yield_region, parse_region
 
-from SequenceOperations import compute_sequence_identity, convolve_sequence, transform_with_hill_sigmoid
-from SubSequenceGenerator import generate_shifted_sequences, generate_shifted_sequences_varLen
-from SequenceEncoding import one_hot_encoding
+from SequenceOperations import transform_with_hill_sigmoid
+from SequenceOperations import dequantize_scores, QUANTIZATION_SCALE, QUANTIZED_MISSING
 
 ## CORE ##
 from AbstractAutoCorrelationEngine import AutoCorrelationEngine
+from EngineArguments import build_engine_arguments
+from ParallelProcessing import process_records
+from result_io import open_result_matrix, write_result_metadata, VariableLengthMatrix
+from result_io import build_result_pyramid, write_result_pyramid, read_result_pyramid, select_pyramid_level
+from ResultCache import ResultCache, yield_cached_results, file_source_key
+from EngineProfiler import EngineProfiler
+from RepeatRegions import RepeatRegionExtractor, write_repeat_regions, sort_repeat_regions
+from Pipeline import pipeline_records, prefetch
 
-## GUI
-from matplotlib import pyplot as plt
 
+def GetPlottingFunction( plot_scoring_function, min_shift, max_shift, figure_size, midpoint, steepness, column_step=1 ) :
 
-def GetPlottingFunction( plot_scoring_function, min_shift, max_shift, figure_size, midpoint, steepness ) :
+	## GUI ( imported on use, so that headless runs never load matplotlib )
+	from matplotlib import pyplot as plt
 
-	def wrapper_1(autocorrelation_matrix, name) :
-		row_length = len(autocorrelation_matrix[0])
-		autocorrelation_matrix_filled = [ np.append(row, np.nan*np.ones(row_length-len(row)) ) for row in autocorrelation_matrix ]
+	# matrices wider than the figure are drawn from the pyramid level matching its pixel width ( see result_io.build_result_pyramid )
+	pixel_width = figure_size[0] * plt.rcParams["figure.dpi"]
+
+	def downsample(autocorrelation_matrix, pyramid) :
+		# tails of VariableLengthMatrix rows are NaN (or QUANTIZED_MISSING), left blank by matshow and ignored by pooling
+		if pyramid is None and autocorrelation_matrix.shape[1] > pixel_width :
+			pyramid = build_result_pyramid(autocorrelation_matrix, min_width=pixel_width)
+		level = select_pyramid_level(pyramid or [], pixel_width)
+		if level is None :
+			if autocorrelation_matrix.dtype == np.uint8 :
+				return dequantize_scores(autocorrelation_matrix), 1
+			return autocorrelation_matrix, 1
+		logging.info(f"plotting pyramid level pooling {level['step']} columns")
+		return level["max"], level["step"]
+
+	def draw(axs, autocorrelation_matrix, pyramid) :
+		displayed, step = downsample(autocorrelation_matrix, pyramid)
+		# x axis in sequence positions
+		axs.matshow(displayed, aspect="auto", extent=(0, len(displayed[0])*step*column_step, len(displayed)-0.5, -0.5))
+
+	def wrapper_1(autocorrelation_matrix, name, pyramid=None) :
 		fig, axs = plt.subplots(figsize=figure_size)
-		axs.matshow(autocorrelation_matrix_filled, aspect="auto")
+		draw(axs, autocorrelation_matrix, pyramid)
 		axs.set_yticks( np.arange(0,max_shift-min_shift,2),np.arange(min_shift, max_shift,2) )
 		fig.suptitle(name)
 		plt.tight_layout()
 		plt.show()	
 
-	def wrapper_2(autocorrelation_matrix, name) :
-		row_length = len(autocorrelation_matrix[0])
-		autocorrelation_matrix_filled = [ np.append(row, np.nan*np.ones(row_length-len(row)) ) for row in autocorrelation_matrix ]
-
+	def wrapper_2(autocorrelation_matrix, name, pyramid=None) :
 		fig, axs = plt.subplots(2,1, figsize=figure_size)
-		axs[0].matshow(autocorrelation_matrix_filled, aspect="auto")
+		draw(axs[0], autocorrelation_matrix, pyramid)
 		axs[0].set_yticks( np.arange(0,max_shift-min_shift,2),np.arange(min_shift, max_shift,2) )
 		x = np.linspace(0,1,100)
 		axs[1].plot(x, transform_with_hill_sigmoid(x,midpoint,steepness))
@@ -64,6 +86,12 @@ def parse_commandline_arguments() :
 		type=str,
 		help="format for parsing sequence file"
 	)
+	parser.add_argument(
+		"-r","--region",
+		default=None,
+		type=str,
+		help="only process this region of an indexed FASTA file, given as chrom:start-end (1-based, inclusive)"
+	)
 	parser.add_argument(
 		"-ls","--lower_shift",
 		default=1,
@@ -99,6 +127,128 @@ def parse_commandline_arguments() :
 		action="store_true",
 		help="plot the sigmoidal scoring function"
 	)
+	parser.add_argument(
+		"-cs","--chunk_size","--chunk-size",
+		default=None,
+		type=int,
+		help="process sequences by tiles producing this many columns each, bounding memory usage (default=whole sequence)"
+	)
+	parser.add_argument(
+		"-w","--workers",
+		default=1,
+		type=int,
+		help="number of worker processes sharing the sequence records (default=1)"
+	)
+	parser.add_argument(
+		"-t","--threads",
+		default=1,
+		type=int,
+		help="number of threads sharing the shifts of a sequence (default=1)"
+	)
+	parser.add_argument(
+		"-o","--output",
+		default=None,
+		type=str,
+		help="directory where each autocorrelation matrix is written as <name>.npy with a <name>.json sidecar"
+	)
+	parser.add_argument(
+		"-np","--no_plot","--no-plot",
+		action="store_true",
+		help="do not plot results (headless run)"
+	)
+	parser.add_argument(
+		"-c","--cache",
+		default=None,
+		type=str,
+		help="cache directory for parsed, encoded and pre-scoring results. Re-runs changing only -mp/-sp skip everything but scoring"
+	)
+	parser.add_argument(
+		"-csz","--cache_size",
+		default=4.0,
+		type=float,
+		help="maximal cache size in GB, least recently used entries are evicted above (default=4)"
+	)
+	parser.add_argument(
+		"-p","--profile",
+		default=None,
+		type=str,
+		help="write per-record, per-stage timing and memory report to this path (CSV if it ends with .csv, JSON otherwise)"
+	)
+	parser.add_argument(
+		"-pr","--precision",
+		default="float64",
+		choices=AutoCorrelationEngine.PRECISIONS,
+		help="float32 halves the memory of convolution and scores, uint8 stores scores as codes 0-254 (score = code/254, 255 = missing) (default=float64)"
+	)
+	parser.add_argument(
+		"-rr","--repeat_regions",
+		default=None,
+		type=str,
+		help="write intervals of each shift scoring above --threshold to this path (BED if it ends with .bed, TSV otherwise)"
+	)
+	parser.add_argument(
+		"-th","--threshold",
+		default=0.5,
+		type=float,
+		help="for repeat regions, minimal score of positions (default=0.5)"
+	)
+	parser.add_argument(
+		"-mg","--max_gap",
+		default=0,
+		type=int,
+		help="for repeat regions, maximal number of positions below threshold merged inside a region (default=0)"
+	)
+	parser.add_argument(
+		"-fft","--fft",
+		action="store_true",
+		help="compute identity of all shifts with FFT over windows of -k letters (one column every -k letters), for large shift ranges such as -hs 5000"
+	)
+	parser.add_argument(
+		"-e","--encoding",
+		default="integer",
+		choices=["integer", "packed"],
+		help="sequence encoding : integer codes (any alphabet) or 2-bit packed DNA, 32 bases per 64-bit word, N and IUPAC letters never matching (default=integer)"
+	)
+	parser.add_argument(
+		"-hop","--hop",
+		default=None,
+		type=int,
+		help="only compute one column every hop positions after convolution, -cs must be a multiple of it (default=1, -k with --fft)"
+	)
+	parser.add_argument(
+		"-pyr","--pyramid",
+		action="store_true",
+		help="with -o, also write max and mean pooled versions of each matrix (8x, 64x... fewer columns), used for plotting"
+	)
+	parser.add_argument(
+		"-bl","--batch_length",
+		default=10000,
+		type=int,
+		help="records shorter than this many letters are processed together, by batches of similar lengths (default=10000, 0 disables). Disabled by --profile, which reports each record"
+	)
+	parser.add_argument(
+		"-pd","--pipeline_depth",
+		default=0,
+		type=int,
+		help="read, compute and write records in concurrent stages, with at most this many records waiting between stages (default=0, stages run one after another)"
+	)
+	parser.add_argument(
+		"-sc","--screen",
+		action="store_true",
+		help="with --chunk_size, only compute the tiles and shifts where identical k-mers are spaced by the shift more often than at random, other cells are left empty"
+	)
+	parser.add_argument(
+		"-sk","--screen_kmer",
+		default=5,
+		type=int,
+		help="k-mer length of --screen (default=5)"
+	)
+	parser.add_argument(
+		"-sv","--server",
+		default=None,
+		type=str,
+		help="request matrices from a running EngineService at this URL (such as http://127.0.0.1:8765) instead of computing them"
+	)
 	parser.add_argument(
 		"-fs","--fig_size",
 		nargs=2,
@@ -107,32 +257,281 @@ def parse_commandline_arguments() :
 		help="plot height/width"
 	)
 	args = parser.parse_args()
+	if args.region is not None and args.file_format != "fasta" :
+		parser.error("--region requires a FASTA file")
+	if args.cache is not None and ( args.workers > 1 or args.chunk_size is not None ) :
+		parser.error("--cache can not be combined with --workers or --chunk_size")
+	if args.profile is not None and args.workers > 1 :
+		parser.error("--profile can not be combined with --workers, worker processes are not instrumented")
+	if args.fft and ( args.workers > 1 or args.chunk_size is not None or args.cache is not None ) :
+		parser.error("--fft can not be combined with --workers, --chunk_size or --cache")
+	if args.hop is None :
+		args.hop = args.kernel_size if args.fft else 1
+	# same ranges as EngineService.check_parameters
+	if args.kernel_size < 1 or args.hop < 1 :
+		parser.error("--kernel_size and --hop must be at least 1")
+	if not 0 <= args.lower_shift < args.higher_shift :
+		parser.error("shifts must satisfy 0 <= --lower_shift < --higher_shift")
+	if args.chunk_size is not None and args.chunk_size < 1 :
+		parser.error("--chunk_size must be at least 1")
+	if args.chunk_size is not None and args.chunk_size % args.hop :
+		parser.error("--chunk_size must be a multiple of --hop")
+	if args.pyramid and args.output is None :
+		parser.error("--pyramid requires --output")
+	if args.encoding == "packed" and ( args.fft or args.cache is not None ) :
+		parser.error("--encoding packed can not be combined with --fft or --cache")
+	if args.screen and ( args.chunk_size is None or args.workers > 1 or args.encoding == "packed" ) :
+		parser.error("--screen requires --chunk_size and can not be combined with --workers or --encoding packed")
+	if args.server is not None and ( args.workers > 1 or args.chunk_size is not None or args.cache is not None or args.fft or args.profile is not None ) :
+		parser.error("--server can not be combined with --workers, --chunk_size, --cache, --fft or --profile")
 	return args
 
-def main( file_path, file_format, min_shift=1, max_shift=40, kernel_size=120, midpoint=0.5, steepness=20 ) :
+def main( file_path, file_format, min_shift=1, max_shift=40, kernel_size=120, midpoint=0.5, steepness=20, chunk_size=None, workers=1, threads=1, output_directory=None, plot_F=None, region=None, cache_directory=None, cache_size=4.0, profile_path=None, precision="float64", regions_path=None, threshold=0.5, max_gap=0, fft=False, encoding="integer", hop=1, pyramid=False, batch_length=0, pipeline_depth=0, screen_kmer=None, server=None ) :
 
-	auto_corr_worker = AutoCorrelationEngine(
-		encoding_F    = one_hot_encoding,
-		comparison_F  = compute_sequence_identity,
-		convolution_F = partial(convolve_sequence, kernel_size=kernel_size, convolution_mode="valid"),
-		scoring_F     = partial(transform_with_hill_sigmoid, midpoint=midpoint, steepness=steepness ),
-		generator_F   = partial(generate_shifted_sequences, min_shift=min_shift, max_shift=max_shift)
+	engine_arguments = build_engine_arguments( min_shift, max_shift, kernel_size, midpoint, steepness, threads, precision, hop, encoding, screen_kmer )
+	parameters = dict(
+		file = file_path,
+		min_shift = min_shift,
+		max_shift = max_shift,
+		kernel_size = kernel_size,
+		convolution_mode = "valid",
+		midpoint = midpoint,
+		steepness = steepness,
+		precision = precision,
+		encoding = encoding,
+		column_step = hop,
 	)
+	if screen_kmer is not None :
+		parameters["screen"] = dict( kmer=screen_kmer, window_size=chunk_size )
+	if precision == "uint8" :
+		parameters["quantization"] = dict( scale=QUANTIZATION_SCALE, missing=QUANTIZED_MISSING )
+	overlap = kernel_size + max_shift
+	if region is None :
+		read_records = partial( yield_sequences, file_path, file_format )
+	else :
+		read_records = partial( yield_region, file_path, region )
+	records = read_records()
+	hooks = list()
+	if profile_path is not None :
+		profiler = EngineProfiler()
+		hooks.append( profiler )
+
+	if regions_path is not None :
+		regions_handle = open( regions_path, "w" )
+		regions_format = "bed" if regions_path.endswith(".bed") else "tsv"
+		new_extractor = partial( region_extractor, region=region, shifts=range(min_shift, max_shift), threshold=threshold, kernel_size=kernel_size, max_gap=max_gap, step=hop )
+
+	# only repeat regions are requested : tiles are consumed as they are computed, the dense matrix is never stitched
+	streaming = regions_path is not None and chunk_size is not None and output_directory is None and plot_F is None and workers == 1 and cache_directory is None and screen_kmer is None
+	if streaming :
+		compute = partial( stream_repeat_regions, engine_arguments=engine_arguments, chunk_size=chunk_size, overlap=overlap, new_extractor=new_extractor, hooks=hooks, hop=hop )
+	elif server is not None :
+		from EngineService import EngineClient, yield_service_results # imported on use, only needed by the client mode
+		client = EngineClient( server )
+		def compute( records ) :
+			# records are read by the service
+			results = yield_service_results( client, file_path, file_format, region, min_shift=min_shift, max_shift=max_shift, kernel_size=kernel_size, midpoint=midpoint, steepness=steepness, precision=precision, hop=hop, encoding=encoding )
+			if output_directory is not None :
+				results = write_results( results, output_directory )
+			return results
+	elif cache_directory is not None :
+		cache = ResultCache( cache_directory, max_bytes=int(cache_size * 2**30) )
+		source_key = file_source_key( file_path, file_format, region )
+		auto_corr_worker = AutoCorrelationEngine( **engine_arguments )
+		for hook in hooks :
+			auto_corr_worker.add_hook( hook )
+		def compute( records ) :
+			# records are read by the cache, on miss only
+			results = yield_cached_results( cache, auto_corr_worker, source_key, read_records )
+			if output_directory is not None :
+				results = write_results( results, output_directory )
+			return results
+	elif workers > 1 :
+		compute = partial( process_records, engine_arguments=engine_arguments, workers=workers, chunk_size=chunk_size, overlap=overlap, output_directory=output_directory, hop=hop )
+	else :
+		compute = partial( run_engine, engine_arguments=engine_arguments, chunk_size=chunk_size, overlap=overlap, output_directory=output_directory, hooks=hooks, fft=fft, hop=hop, batch_length=0 if fft or encoding == "packed" or screen_kmer is not None or profile_path is not None else batch_length, screen=None if screen_kmer is None else range(min_shift, max_shift) )
+	if profile_path is not None :
+		compute = partial( name_profile_records, compute=compute, profiler=profiler )
+
+	if pipeline_depth > 0 and cache_directory is None and server is None :
+		results = pipeline_records( records, compute, pipeline_depth )
+	elif pipeline_depth > 0 :
+		results = prefetch( compute(records), pipeline_depth, name="computing" )
+	else :
+		results = compute( records )
+
+	if streaming :
+		for name, regions in results :
+			write_repeat_regions( regions_handle, regions, regions_format )
+		results = list()
+
+	for name, auto_corr_matrix in results :
+		levels = None
+		if output_directory is not None :
+			if pyramid :
+				write_result_metadata( output_directory, name, auto_corr_matrix, parameters, write_result_pyramid(output_directory, name, auto_corr_matrix) )
+				levels = read_result_pyramid( output_directory, name )
+			else :
+				write_result_metadata( output_directory, name, auto_corr_matrix, parameters )
+		if regions_path is not None :
+			extractor = new_extractor( name )
+			write_repeat_regions( regions_handle, sort_repeat_regions( extractor.consume(auto_corr_matrix) + extractor.finish() ), regions_format )
+		if plot_F is not None :
+			plot_F(auto_corr_matrix, name, pyramid=levels)
+
+	if regions_path is not None :
+		regions_handle.close()
+		logging.info(f"repeat regions written to {regions_path}")
+	if profile_path is not None :
+		profiler.write( profile_path )
+
+def name_profile_records( records, compute, profiler ) :
+	"""
+	run compute over records and name the profiling record of each result as soon as it is computed
+	( in the computing stage when records are pipelined )
+	"""
+	for name, result in compute( records ) :
+		profiler.name_last_record( name )
+		yield name, result
+
+def region_extractor( name, region, shifts, threshold, kernel_size, max_gap, step ) :
+	"""
+	build the repeat region extractor of a record. A region record is reported on its chromosome, in chromosome coordinates
+	"""
+	chrom, offset = name, 0
+	if region is not None :
+		chrom, offset, _ = parse_region( region )
+	return RepeatRegionExtractor( chrom, shifts, threshold, kernel_size, max_gap=max_gap, offset=offset, step=step )
+
+def stream_repeat_regions( records, engine_arguments, chunk_size, overlap, new_extractor, hooks=(), hop=1 ) :
+	"""
+	run a single AutoCorrelationEngine over records by tiles ( see AutoCorrelationEngine.process_chunked )
+	and yield (name, repeat regions) pairs, regions being extracted tile by tile then sorted once the record is done
+	"""
+	auto_corr_worker = AutoCorrelationEngine( **engine_arguments )
+	for hook in hooks :
+		auto_corr_worker.add_hook( hook )
+	for name, sequence in records :
+		logging.info(f"Extracting repeat regions of {name}")
+		extractor = new_extractor( name )
+		regions = list()
+		for block in auto_corr_worker.process_chunked( sequence, chunk_size, overlap, hop ) :
+			regions += extractor.consume( block )
+		yield name, sort_repeat_regions( regions + extractor.finish() )
+
+def write_results( results, output_directory ) :
+	"""
+	copy (name, autocorrelation matrix) pairs into memory-mapped .npy files
+	"""
+	for name, auto_corr_matrix in results :
+		output = open_result_matrix( output_directory, name, auto_corr_matrix.shape, auto_corr_matrix.dtype )
+		output[...] = auto_corr_matrix
+		if getattr( auto_corr_matrix, "row_lengths", None ) is not None :
+			output = VariableLengthMatrix( output, auto_corr_matrix.row_lengths )
+		yield name, output
+
+def run_engine( records, engine_arguments, chunk_size, overlap, output_directory, hooks=(), fft=False, hop=1, batch_length=0, batch_bytes=2**25, screen=None ) :
+	"""
+	run a single AutoCorrelationEngine over records and yield (name, autocorrelation matrix) pairs, in input order.
+	when output_directory is set, matrices are written straight into memory-mapped .npy files.
+	hooks are registered on the engine ( see AutoCorrelationEngine.add_hook )
+	with fft, matrices are computed by AutoCorrelationEngine.process_spectrum
+	records shorter than batch_length are gathered and processed with AutoCorrelationEngine.process_batch,
+	a batch being run once its matrices (letters x shifts x score size) reach batch_bytes bytes, as they are all kept until the batch is consumed
+	with screen (the shift range), chunked records are processed with AutoCorrelationEngine.process_screened
+	"""
+	auto_corr_worker = AutoCorrelationEngine( **engine_arguments )
+	for hook in hooks :
+		auto_corr_worker.add_hook( hook )
+
+	def run_batch( batch ) :
+		logging.info(f"Running AutoCorrelation on a batch of {len(batch)} records")
+		matrices = auto_corr_worker.process_batch( [ sequence for _, sequence in batch ], overlap, hop )
+		results = zip( [ name for name, _ in batch ], matrices )
+		if output_directory is not None :
+			results = write_results( results, output_directory )
+		return results
+
+	# matrix bytes per letter of a batched record
+	letter_bytes = ( auto_corr_worker.shift_count(auto_corr_worker.GenerateShiftMatrix) or overlap ) * auto_corr_worker.score_dtype().itemsize
+	batch = list()
+	batch_letters = 0
+	for name, sequence in records :
+		if len(sequence) < batch_length :
+			batch.append( (name, sequence) )
+			batch_letters += len(sequence)
+			if batch_letters * letter_bytes >= batch_bytes :
+				yield from run_batch( batch )
+				batch = list()
+				batch_letters = 0
+			continue
+		if batch :
+			yield from run_batch( batch )
+			batch = list()
+			batch_letters = 0
 
-	for name, sequence in yield_sequences( file_path, file_format) :
 		logging.info(f"Running AutoCorrelation on {name}")
-		auto_corr_matrix = auto_corr_worker.process(sequence)
-		plot_results(auto_corr_matrix, name)
+		allocate = None if output_directory is None else partial(open_result_matrix, output_directory, name)
+		if fft :
+			auto_corr_matrix = auto_corr_worker.process_spectrum(sequence)
+			if output_directory is not None :
+				auto_corr_matrix = next( write_results([(name, auto_corr_matrix)], output_directory) )[1]
+		elif chunk_size is None :
+			auto_corr_matrix = auto_corr_worker.process_vectorized(sequence, allocate=allocate)
+		elif screen is not None :
+			auto_corr_matrix = auto_corr_worker.process_screened(sequence, screen.start, screen.stop, chunk_size, overlap, allocate=allocate or np.empty, hop=hop)
+		else :
+			auto_corr_matrix = auto_corr_worker.process_stitched(sequence, chunk_size, overlap, allocate=allocate or np.empty, hop=hop)
+		yield name, auto_corr_matrix
+	if batch :
+		yield from run_batch( batch )
 
 def InitLog(args) :
 	logging.info("Sequence AutoCorrelation Pipeline")
 	logging.info("Author : Antoine Schramm")
 
 	logging.info(f"sequences will be analyzed from {args.file} given {args.file_format} format")
+	if args.region is not None :
+		logging.info(f"only region {args.region} will be analyzed")
 	logging.info(f"autocorrelation will study sequence shifts from {args.lower_shift} to {args.higher_shift}")
 	logging.info(f"signal convolution by windowing over {args.kernel_size} positions")
 	logging.info(f"scoring using sigmoidal transformation with midpoint at {args.midpoint} and steepness of {args.steepness}")
+	if args.chunk_size is not None :
+		logging.info(f"sequences will be processed by tiles of {args.chunk_size} columns")
+	if args.workers > 1 :
+		logging.info(f"sequence records will be shared between {args.workers} worker processes")
+	if args.threads > 1 :
+		logging.info(f"shifts of each sequence will be shared between {args.threads} threads")
+	if args.batch_length > 0 and not args.fft and args.encoding != "packed" and not args.screen and args.profile is None :
+		logging.info(f"records shorter than {args.batch_length} letters will be processed by batches")
+	if args.output is not None :
+		logging.info(f"results will be written to {args.output}")
+	if args.cache is not None :
+		logging.info(f"intermediate results will be cached in {args.cache} (up to {args.cache_size} GB)")
+	if args.repeat_regions is not None :
+		logging.info(f"regions scoring above {args.threshold} will be written to {args.repeat_regions}")
+	if args.encoding == "packed" :
+		logging.info(f"sequences will be encoded as 2-bit packed nucleotides")
+	if args.hop > 1 :
+		logging.info(f"one column will be computed every {args.hop} positions")
+	if args.pyramid :
+		logging.info(f"pooled versions of each matrix will be written next to it")
+	if args.fft :
+		logging.info(f"identity of all shifts will be computed by FFT over windows of {args.kernel_size} letters")
+	if args.precision != "float64" :
+		logging.info(f"results will be computed with {args.precision} precision")
+	if args.screen :
+		logging.info(f"only tiles and shifts with {args.screen_kmer}-mers spaced by the shift above background will be computed")
+	if args.server is not None :
+		logging.info(f"matrices will be requested from the engine service at {args.server}")
+	if args.pipeline_depth > 0 :
+		logging.info(f"reading, computing and writing will overlap, with up to {args.pipeline_depth} records queued between stages")
+	if args.profile is not None :
+		logging.info(f"profiling report will be written to {args.profile}")
 
+	if args.no_plot :
+		logging.info(f"results will not be plotted")
+		return
 	logging.info(f"will plot scoring function : {args.plot_sigmoid}")
 	logging.info(f"figure size set to {args.fig_size}")
 
@@ -151,14 +550,17 @@ if __name__ == "__main__" :
 	InitLog(args)
 
 
-	plot_results = GetPlottingFunction(
-		plot_scoring_function = args.plot_sigmoid,
-		min_shift	=  args.lower_shift,
-		max_shift	=  args.higher_shift,
-		figure_size = args.fig_size,
-		midpoint = args.midpoint,
-		steepness = args.steepness
-	)
+	plot_results = None
+	if not args.no_plot :
+		plot_results = GetPlottingFunction(
+			plot_scoring_function = args.plot_sigmoid,
+			min_shift	=  args.lower_shift,
+			max_shift	=  args.higher_shift,
+			figure_size = args.fig_size,
+			midpoint = args.midpoint,
+			steepness = args.steepness,
+			column_step = args.hop
+		)
 
 	main(
 		file_path	=  args.file,
@@ -168,4 +570,25 @@ if __name__ == "__main__" :
 		kernel_size	=  args.kernel_size,
 		midpoint    =  args.midpoint,
 		steepness   =  args.steepness,
+		chunk_size  =  args.chunk_size,
+		workers     =  args.workers,
+		threads     =  args.threads,
+		output_directory = args.output,
+		plot_F      =  plot_results,
+		region      =  args.region,
+		cache_directory = args.cache,
+		cache_size  =  args.cache_size,
+		profile_path = args.profile,
+		precision   =  args.precision,
+		regions_path = args.repeat_regions,
+		threshold   =  args.threshold,
+		max_gap     =  args.max_gap,
+		fft         =  args.fft,
+		encoding    =  args.encoding,
+		hop         =  args.hop,
+		pyramid     =  args.pyramid,
+		batch_length = args.batch_length,
+		pipeline_depth = args.pipeline_depth,
+		screen_kmer = args.screen_kmer if args.screen else None,
+		server      = args.server,
 	)
@@ -0,0 +1,199 @@
+
+import numpy as np
+import logging
+import json
+import os
+import re
+
+
+def result_path( output_directory, name, extension ) :
+	"""
+	build the path of a result file for a sequence entry.
+	characters that are not safe in file names (such as / or | in sequence ids) are replaced by _
+	"""
+	file_name = re.sub( r"[^A-Za-z0-9._-]", "_", name )
+	return os.path.join( output_directory, f"{file_name}.{extension}" )
+
+
+class VariableLengthMatrix( np.ndarray ) :
+	"""
+	2D result buffer whose rows hold a variable number of values, such as the output of the per-shift protocol
+	with generate_shifted_sequences_varLen ( see AutoCorrelationEngine.process ) : the row of shift s is shorter than the previous one.
+
+	Row i holds row_lengths[i] valid values followed by NaN ( QUANTIZED_MISSING for uint8 scores ),
+	so that the matrix can be plotted, pooled and written as any 2D array.
+	row_lengths only survive operations keeping the matrix shape, slices drop them.
+
+	inputs :
+		- array (array) : 2D array holding the rows
+		- row_lengths (array[int]) : number of valid values of each row
+	"""
+
+	def __new__( cls, array, row_lengths ) :
+		matrix = np.asarray( array ).view( cls )
+		matrix.row_lengths = np.asarray( row_lengths, dtype=np.intp )
+		return matrix
+
+	def __array_finalize__( self, source ) :
+		row_lengths = getattr( source, "row_lengths", None )
+		self.row_lengths = row_lengths if getattr( source, "shape", None ) == self.shape else None
+
+
+def open_result_matrix( output_directory, name, shape, dtype ) :
+	"""
+	Create a memory-mapped .npy file for the autocorrelation matrix of a sequence entry.
+	The returned array can be written in place, data goes straight to the file.
+	The file can be loaded back with numpy.load (use mmap_mode="r" to avoid reading it whole).
+
+	inputs :
+		- output_directory (str) : directory in which results are written, created if missing
+		- name (str) : name of the sequence entry
+		- shape (tuple) : shape of the matrix
+		- dtype (numpy dtype) : type of the matrix values
+
+	returns :
+		- matrix (numpy.memmap) : writable matrix backed by <output_directory>/<name>.npy
+	"""
+	os.makedirs( output_directory, exist_ok=True )
+	file_path = result_path( output_directory, name, "npy" )
+	logging.info(f"Writing {name} autocorrelation matrix of shape {shape} to {file_path}")
+	return np.lib.format.open_memmap( file_path, mode="w+", dtype=dtype, shape=shape )
+
+
+def write_result_metadata( output_directory, name, matrix, parameters, pyramid=None ) :
+	"""
+	Write the JSON sidecar describing an autocorrelation matrix written with open_result_matrix.
+
+	The sidecar holds the parameters used for computation, the matrix shape and dtype and the shift axis
+	( shift value of each matrix row, from min_shift to max_shift excluded ).
+
+	inputs :
+		- output_directory (str) : directory in which results are written
+		- name (str) : name of the sequence entry
+		- matrix (array) : the autocorrelation matrix, the valid length of each row is recorded for VariableLengthMatrix
+		- parameters (dict) : parameters used for computation, must contain min_shift and max_shift
+		- pyramid (list[dict]) : level descriptions returned by write_result_pyramid, if any
+
+	returns :
+		- file_path (str) : path to the JSON sidecar
+	"""
+	metadata = dict(
+		name   = name,
+		matrix = os.path.basename( result_path(output_directory, name, "npy") ),
+		shape  = list(matrix.shape),
+		dtype  = str(matrix.dtype),
+		shifts = list( range(parameters["min_shift"], parameters["max_shift"]) ),
+		parameters = parameters,
+	)
+	if getattr( matrix, "row_lengths", None ) is not None :
+		metadata["row_lengths"] = matrix.row_lengths.tolist()
+	if pyramid is not None :
+		metadata["pyramid"] = pyramid
+	file_path = result_path( output_directory, name, "json" )
+	with open( file_path, "w" ) as handle :
+		json.dump( metadata, handle, indent=1 )
+	return file_path
+
+
+### MULTI-RESOLUTION PYRAMID ###
+#
+# level i of the pyramid of a matrix pools its columns by groups of factor**i, with both the maximum (so that
+# short repeats remain visible) and the mean of each group. Levels are float32 and NaN values are ignored.
+# Only level 1 is computed from the full matrix, by blocks of columns, each following level from the previous one.
+
+def _pool_columns( values, sums, counts, factor ) :
+	"""
+	pool columns by groups of factor, the last group being partial.
+	values holds maxima, sums and counts the sums and numbers of non NaN values (computed from values if None)
+	"""
+	if sums is None :
+		valid = ~np.isnan( values )
+		sums, counts = np.where( valid, values, 0 ), valid.astype( np.int64 )
+	group_count = -(-values.shape[1] // factor)
+	padding = ( (0,0), (0, group_count*factor - values.shape[1]) )
+	shape = ( values.shape[0], group_count, factor )
+	maxima = np.fmax.reduce( np.pad(values, padding, constant_values=np.nan).reshape(shape), axis=2 )
+	return maxima, np.pad(sums, padding).reshape(shape).sum( axis=2 ), np.pad(counts, padding).reshape(shape).sum( axis=2 )
+
+
+def build_result_pyramid( matrix, factor=8, min_width=1024, block_columns=2**16 ) :
+	"""
+	Build the multi-resolution pyramid of an autocorrelation matrix, pooling columns until the width is at most min_width.
+	The matrix is read by blocks of block_columns groups of columns, so that a memory-mapped matrix is never loaded whole.
+	uint8 matrices are taken as quantized scores ( see SequenceOperations.quantize_scores ).
+
+	returns :
+		- levels (list[dict]) : step (number of matrix columns per level column), max and mean (2D float32 arrays)
+	"""
+	from SequenceOperations import dequantize_scores
+
+	def as_float( block ) :
+		if block.dtype == np.uint8 :
+			return dequantize_scores( block )
+		return np.asarray( block, dtype=np.float32 )
+
+	levels = list()
+	width = matrix.shape[1]
+	step = factor
+	while width > min_width :
+		if not levels :
+			pooled = [ _pool_columns( as_float(matrix[:, start:start+block_columns*factor]), None, None, factor ) for start in range(0, width, block_columns*factor) ]
+			maxima, sums, counts = [ np.concatenate(arrays, axis=1) for arrays in zip(*pooled) ]
+		else :
+			maxima, sums, counts = _pool_columns( maxima, sums, counts, factor )
+		with np.errstate( invalid="ignore", divide="ignore" ) :
+			means = ( sums / counts ).astype( np.float32 )
+		levels.append( dict( step=step, max=maxima.astype(np.float32, copy=False), mean=means ) )
+		width = maxima.shape[1]
+		step *= factor
+	return levels
+
+
+def write_result_pyramid( output_directory, name, matrix, factor=8, min_width=1024 ) :
+	"""
+	Build the pyramid of an autocorrelation matrix ( see build_result_pyramid ) and write each level next to the matrix,
+	as <name>.L<level>.max.npy and <name>.L<level>.mean.npy
+
+	returns :
+		- pyramid (list[dict]) : level descriptions (step, shape and file names), to be recorded by write_result_metadata
+	"""
+	pyramid = list()
+	for level, arrays in enumerate( build_result_pyramid(matrix, factor, min_width), start=1 ) :
+		description = dict( step=arrays["step"], shape=list(arrays["max"].shape) )
+		for pooling in ("max", "mean") :
+			file_path = result_path( output_directory, f"{name}.L{level}.{pooling}", "npy" )
+			np.save( file_path, arrays[pooling] )
+			description[pooling] = os.path.basename( file_path )
+		pyramid.append( description )
+	logging.info(f"Wrote {len(pyramid)} pyramid levels of {name} autocorrelation matrix")
+	return pyramid
+
+
+def read_result_pyramid( output_directory, name ) :
+	"""
+	Open the pyramid levels recorded in the JSON sidecar of a sequence entry, as read-only memory maps.
+
+	returns :
+		- levels (list[dict]) : step, max and mean of each level ( see build_result_pyramid ), empty without pyramid
+	"""
+	with open( result_path(output_directory, name, "json") ) as handle :
+		metadata = json.load( handle )
+	return [
+		dict(
+			step = description["step"],
+			max  = np.load( os.path.join(output_directory, description["max"]), mmap_mode="r" ),
+			mean = np.load( os.path.join(output_directory, description["mean"]), mmap_mode="r" ),
+		)
+		for description in metadata.get( "pyramid", [] )
+	]
+
+
+def select_pyramid_level( levels, pixel_width ) :
+	"""
+	pick the coarsest level still having at least pixel_width columns, None if the full matrix is needed
+	"""
+	selected = None
+	for level in levels :
+		if level["max"].shape[1] >= pixel_width :
+			selected = level
+	return selected
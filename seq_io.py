@@ -1,19 +1,236 @@
 
-from Bio import SeqIO
+from collections import namedtuple
+import numpy as np
 import logging
+import mmap
+import os
+import re
+
+
+### FASTA INDEX ###
+#
+# native FASTA reader : the file is memory-mapped and described by a samtools-like .fai index
+# (one line per record : name, length, offset, line_bases, line_width). Records and regions are
+# returned as uint8 arrays (views of the file whenever possible), ready for SequenceEncoding.integer_encoding.
+
+FastaIndexEntry = namedtuple( "FastaIndexEntry", ["name", "length", "offset", "line_bases", "line_width"] )
+
+
+def build_fasta_index( file_name ) :
+	"""
+	Scan a FASTA file and build its index.
+	Like samtools faidx, all sequence lines of a record must have the same length, except the last one.
+
+	inputs :
+		- file_name (str) path to FASTA file
+
+	returns :
+		- index (dict) : record name -> FastaIndexEntry, in file order
+
+	raises :
+		- FileNotFoundError -> file_name doesn't corresponds to any file on the system
+		- ValueError -> the file is not a FASTA file, a record has lines of different lengths (or blank lines),
+		               or two records have the same name
+	"""
+	logging.info(f"Building FASTA index of {file_name}")
+	index = dict()
+	if os.path.getsize(file_name) == 0 :
+		return index
+
+	with open( file_name, "rb" ) as handle :
+		content = mmap.mmap( handle.fileno(), 0, access=mmap.ACCESS_READ )
+	letters = np.frombuffer( content, dtype=np.uint8 )
+
+	if content[:1] != b">" :
+		raise ValueError(f"{file_name} is not a FASTA file, it should start with >")
+
+	header_start = 0
+	while header_start != -1 :
+		header_end = content.find( b"\n", header_start )
+		if header_end == -1 :
+			header_end = len(content)
+		header = content[header_start+1:header_end].decode().strip()
+		name = header.split()[0] if header else ""
+
+		offset = header_end + 1
+		next_header = content.find( b"\n>", header_end )
+		record_end = len(content) if next_header == -1 else next_header + 1
+
+		# measure the first sequence line, including its end of line character(s)
+		first_line_end = content.find( b"\n", offset, record_end )
+		if first_line_end == -1 :
+			first_line_end = record_end
+		line_width = first_line_end + 1 - offset
+		line_bases = len( content[offset:first_line_end].rstrip(b"\r") )
+
+		# remove the trailing end of line characters of the record, then deduce its length from line geometry
+		sequence_end = record_end
+		while sequence_end > offset and content[sequence_end-1:sequence_end] in (b"\n", b"\r") :
+			sequence_end -= 1
+		byte_count = sequence_end - offset
+		full_lines, last_line = divmod( byte_count, line_width ) if line_width > 0 else (0, 0)
+		length = full_lines * line_bases + min( last_line, line_bases )
+
+		# every full line must end at the same column, and the last partial line hold no end of line
+		line_ends = offset + np.arange( 1, full_lines+1 ) * line_width - 1
+		last_line_start = offset + full_lines * line_width
+		if line_bases == 0 and byte_count > 0 or not np.all( letters[line_ends] == ord("\n") ) or content.find( b"\n", last_line_start, sequence_end ) != -1 :
+			raise ValueError(f"record {name} of {file_name} has sequence lines of different lengths")
+		if name in index :
+			raise ValueError(f"record name {name} appears twice in {file_name}")
+
+		index[name] = FastaIndexEntry( name, length, offset, line_bases, line_width )
+		header_start = next_header if next_header == -1 else next_header + 1
+
+	del letters
+	content.close()
+	return index
+
+
+def write_fasta_index( index, index_name ) :
+	with open( index_name, "w" ) as handle :
+		for entry in index.values() :
+			handle.write( "\t".join( str(value) for value in entry ) + "\n" )
+
+
+def read_fasta_index( file_name ) :
+	"""
+	Get the index of a FASTA file.
+	The <file_name>.fai index is reused if it is newer than the FASTA file, otherwise the index is built and
+	written next to the FASTA file (kept in memory only if the directory is not writable).
+
+	inputs :
+		- file_name (str) path to FASTA file
+
+	returns :
+		- index (dict) : record name -> FastaIndexEntry, in file order
+	"""
+	index_name = f"{file_name}.fai"
+	if os.path.exists(index_name) and os.path.getmtime(index_name) >= os.path.getmtime(file_name) :
+		index = dict()
+		with open( index_name ) as handle :
+			for line in handle :
+				name, *values = line.rstrip("\n").split("\t")
+				index[name] = FastaIndexEntry( name, *map(int, values[:4]) )
+		return index
+
+	index = build_fasta_index( file_name )
+	try :
+		write_fasta_index( index, index_name )
+	except OSError as error :
+		logging.warning(f"FASTA index could not be written to {index_name} ({error}), it is kept in memory")
+	return index
+
+
+def parse_region( region ) :
+	"""
+	Parse a samtools-like region string.
+
+	inputs :
+		- region (str) : chrom, chrom:start or chrom:start-end, with 1-based inclusive coordinates (commas allowed)
+
+	returns :
+		- name (str) : the record name
+		- start (int) : 0-based start position
+		- end (int or None) : 0-based excluded end position, None for the end of the record
+
+	raises :
+		- ValueError -> the region is malformed
+	"""
+	match = re.fullmatch( r"(.+?)(?::([\d,]+)(?:-([\d,]+))?)?", region.strip() )
+	if match is None :
+		raise ValueError(f"malformed region {region}, expected chrom:start-end")
+	name, start, end = match.groups()
+	start = int( start.replace(",", "") ) - 1 if start else 0
+	end = int( end.replace(",", "") ) if end else None
+	if start < 0 or ( end is not None and end < start ) :
+		raise ValueError(f"malformed region {region}, expected 1 <= start <= end")
+	return name, start, end
+
+
+class IndexedFasta() :
+	"""
+	Random access to the records of a memory-mapped FASTA file.
+
+	fetch returns the letters of a record or a region as a uint8 array.
+	When the requested letters lay on a single line of the file (always the case for single-line FASTA),
+	the array is a view of the memory-mapped file and no copy is performed. Otherwise, only the
+	requested letters are gathered into a new array. No str object is ever created.
+	"""
+
+	def __init__( self, file_name ) :
+		self.file_name = file_name
+		self.index = read_fasta_index( file_name )
+		self.content = np.zeros( 0, dtype=np.uint8 )
+		if os.path.getsize(file_name) > 0 :
+			with open( file_name, "rb" ) as handle :
+				self.content = np.frombuffer( mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ), dtype=np.uint8 )
+
+	def names( self ) :
+		return list( self.index )
+
+	def fetch( self, name, start=0, end=None ) :
+		"""
+		inputs :
+			- name (str) : record name
+			- start (int) : 0-based start position
+			- end (int) : 0-based excluded end position (default = end of record)
+
+		returns :
+			- letters (array[uint8])
+
+		raises :
+			- KeyError -> unknown record
+		"""
+		entry = self.index[name]
+		end = entry.length if end is None else min( end, entry.length )
+		start = min( start, end )
+		if start == end :
+			return self.content[:0]
+
+		first_line, first_column = divmod( start, entry.line_bases )
+		last_line = (end-1) // entry.line_bases
+		line_start = entry.offset + first_line * entry.line_width
+		if first_line == last_line :
+			return self.content[ line_start+first_column : line_start+first_column+end-start ]
+
+		# gather lines : all but the last one are full lines of line_bases letters
+		line_count = last_line - first_line + 1
+		gathered = np.empty( line_count * entry.line_bases, dtype=np.uint8 ).reshape( line_count, entry.line_bases )
+		gathered[:-1] = np.lib.stride_tricks.as_strided(
+			self.content[line_start:],
+			shape   = (line_count-1, entry.line_bases),
+			strides = (entry.line_width, 1),
+			writeable = False
+		)
+		last_line_start = entry.offset + last_line * entry.line_width
+		last_line_bases = end - last_line * entry.line_bases
+		gathered[-1, :last_line_bases] = self.content[ last_line_start : last_line_start+last_line_bases ]
+		return gathered.reshape(-1)[ first_column : first_column+end-start ]
+
+	def fetch_region( self, region ) :
+		name, start, end = parse_region( region )
+		return self.fetch( name, start, end )
+
+
+### SEQUENCE READERS ###
 
 def yield_sequences( file_name, file_format="fasta") :
 	"""
 	Read a sequence containing file and yields both name and sequence for each entry
 
+	FASTA files are read with the native indexed reader ( see IndexedFasta ) and sequences are
+	yielded as uint8 arrays. Other formats are parsed with Biopython and sequences are yielded as str.
+	FASTA files the index can not describe (irregular line lengths) are also parsed with Biopython.
+
 	inputs :
 		- file_name (str) path to sequence file
 		- file_format (str) (default = fasta) see Biopython SeqIO parsing function.
 
 	yields :
 		- name (str) the name of the entry
-		- sequence (str) the sequence of the entry
-	
+		- sequence (str or array[uint8]) the sequence of the entry
+
 	returns :
 		- None
 
@@ -21,8 +238,40 @@ def yield_sequences( file_name, file_format="fasta") :
 		- FileNotFoundError -> file_name doesn't corresponds to any file on the system
 	"""
 	logging.info(f"Attempting to read and parse {file_name} given {file_format} format")
+
+	if file_format == "fasta" :
+		try :
+			fasta = IndexedFasta( file_name )
+		except ValueError as error :
+			logging.warning(f"{error}, falling back to Biopython parsing")
+		else :
+			for name in fasta.names() :
+				sequence = fasta.fetch( name )
+				logging.info(f"Yield {name} sequence containing {len(sequence)} letters")
+				yield name, sequence
+			return
+
+	from Bio import SeqIO # imported on use, Biopython import time is significant
+
 	for record in SeqIO.parse(file_name, file_format):
 		sequence = str(record.seq)
 		name = str(record.id)
 		logging.info(f"Yield {name} sequence containing {len(sequence)} letters")
 		yield name, sequence
+
+
+def yield_region( file_name, region ) :
+	"""
+	Read a single region of an indexed FASTA file, without reading the rest of the file.
+
+	inputs :
+		- file_name (str) path to FASTA file
+		- region (str) : chrom, chrom:start or chrom:start-end, with 1-based inclusive coordinates
+
+	yields :
+		- name (str) the region
+		- sequence (array[uint8]) the letters of the region
+	"""
+	sequence = IndexedFasta( file_name ).fetch_region( region )
+	logging.info(f"Yield {region} sequence containing {len(sequence)} letters")
+	yield region, sequence
@@ -0,0 +1,32 @@
+
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert( 0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))) )
+
+from AbstractAutoCorrelationEngine import AutoCorrelationEngine
+from EngineArguments import build_engine_arguments
+
+
+MIN_SHIFT, MAX_SHIFT, KERNEL_SIZE = 1, 40, 120
+
+
+def build_engine( hop=1, precision="float64" ) :
+	return AutoCorrelationEngine( **build_engine_arguments(MIN_SHIFT, MAX_SHIFT, KERNEL_SIZE, 0.5, 20, 1, precision, hop) )
+
+
+@pytest.mark.parametrize( "hop", [ 1, 3, 10 ] )
+@pytest.mark.parametrize( "precision", [ "float64", "uint8" ] )
+def test_aligned_hop_keeps_every_hop_column( hop, precision ) :
+	sequence = "".join( np.random.default_rng(0).choice( list("ACGT"), 1000 ) )
+	expected = build_engine( precision=precision ).process_aligned( sequence, MIN_SHIFT, MAX_SHIFT )
+
+	engine = build_engine( hop, precision )
+	engine.process_aligned( sequence, MIN_SHIFT, 20 )
+	output = engine.extend( MIN_SHIFT, MAX_SHIFT )
+
+	np.testing.assert_array_equal( np.asarray(output), np.asarray(expected)[:, ::hop] )
+	positions = len(sequence) - KERNEL_SIZE + 1
+	np.testing.assert_array_equal( output.row_lengths, -( -(positions - np.arange(MIN_SHIFT, MAX_SHIFT)) // hop ) )
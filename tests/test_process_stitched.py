@@ -0,0 +1,53 @@
+
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert( 0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))) )
+
+from AbstractAutoCorrelationEngine import AutoCorrelationEngine
+from EngineArguments import build_engine_arguments
+
+
+MIN_SHIFT, MAX_SHIFT, KERNEL_SIZE = 1, 20, 30
+OVERLAP = KERNEL_SIZE + MAX_SHIFT
+
+
+def random_sequence( length, seed=0 ) :
+	rng = np.random.default_rng( seed )
+	# a repeated unit, so that scores are not all close to 0
+	unit = rng.choice( list("ACGT"), 7 )
+	letters = np.resize( unit, length )
+	mutated = rng.random( length ) < 0.2
+	letters[mutated] = rng.choice( list("ACGTN"), mutated.sum() )
+	return "".join( letters )
+
+
+def build_engine( hop=1, threads=1, precision="float64" ) :
+	return AutoCorrelationEngine( **build_engine_arguments(MIN_SHIFT, MAX_SHIFT, KERNEL_SIZE, 0.5, 20, threads, precision, hop) )
+
+
+@pytest.mark.parametrize( "length", [ 10, 30, OVERLAP-2, OVERLAP-1, OVERLAP, OVERLAP+1, 333, 1000 ] )
+@pytest.mark.parametrize( "chunk_size, hop", [ (1, 1), (7, 1), (64, 1), (500, 1), (12, 3), (60, 5) ] )
+def test_stitched_equals_vectorized( length, chunk_size, hop ) :
+	engine = build_engine( hop )
+	sequence = random_sequence( length )
+	expected = engine.process_vectorized( sequence )
+	stitched = engine.process_stitched( sequence, chunk_size, OVERLAP, hop=hop )
+	assert stitched.shape == expected.shape == (MAX_SHIFT-MIN_SHIFT, -(-max(length-OVERLAP+1, 0) // hop))
+	assert stitched.dtype == expected.dtype
+	np.testing.assert_array_equal( stitched, expected )
+
+
+@pytest.mark.parametrize( "precision", AutoCorrelationEngine.PRECISIONS )
+def test_stitched_equals_vectorized_with_threads( precision ) :
+	engine = build_engine( threads=3, precision=precision )
+	sequence = random_sequence( 2000, seed=1 )
+	np.testing.assert_array_equal( engine.process_stitched(sequence, 128, OVERLAP), engine.process_vectorized(sequence) )
+
+
+@pytest.mark.parametrize( "chunk_size", [ 0, -5 ] )
+def test_chunked_rejects_empty_tiles( chunk_size ) :
+	with pytest.raises( ValueError ) :
+		next( build_engine().process_chunked(random_sequence(100), chunk_size, OVERLAP) )